@@ -1,24 +1,26 @@
 import asyncio
 import logging
 import random
-import weakref
+import typing
 
 from starlette.applications import Starlette
 from starlette.endpoints import WebSocketEndpoint
-from starlette.responses import RedirectResponse
+from starlette.responses import PlainTextResponse, RedirectResponse
 from starlette.routing import Route, WebSocketRoute
 from starlette.websockets import WebSocket
 
-from . import settings
+from . import metrics, settings
 from .player import Player
 from .remote import Remote
 from .util import (
+    auto_restart_coroutine,
     camel_to_underscore,
     cancel_all_background_tasks,
-    convert_obj_to_camel,
     init_pkg_logger,
     run_in_background,
     search_imdb,
+    underscore_to_camel,
+    verify_metrics_token,
     verify_password,
 )
 from .videos import VideosStore
@@ -31,6 +33,21 @@ def index(request):
     return RedirectResponse(settings.INDEX_REDIRECT_URL)
 
 
+def metrics_endpoint(request):
+    # Requests are all proxied through nginx, so the client address can't be trusted. Scrapers need a bearer token.
+    if not verify_metrics_token(request.headers.get("authorization")):
+        return index(request)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+class Command(typing.NamedTuple):
+    handler: typing.Callable
+    admin_only: bool
+    wants_websocket: bool
+    is_async: bool
+    validator: typing.Optional[typing.Callable]
+
+
 def admins_only_command(method):
     method._admin_only = True
     return method
@@ -41,6 +58,35 @@ def wants_websocket_command(method):
     return method
 
 
+def validate_command(validator):
+    def decorator(method):
+        method._validator = validator
+        return method
+
+    return decorator
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def command_registry(cls):
+    # Built once, so dispatching a command is a single dict lookup on its wire (camelCase) name
+    cls.COMMANDS = {
+        underscore_to_camel(name.removeprefix("command_")): Command(
+            handler=method,
+            admin_only=getattr(method, "_admin_only", False),
+            wants_websocket=getattr(method, "_wants_websocket", False),
+            is_async=asyncio.iscoroutinefunction(method),
+            validator=getattr(method, "_validator", None),
+        )
+        for name, method in vars(cls).items()
+        if name.startswith("command_")
+    }
+    return cls
+
+
+@command_registry
 class BackendEndpoint(WebSocketEndpoint):
     PASSWORD_ACCEPTED_USER = "PASSWORD_ACCEPTED_USER"
     PASSWORD_ACCEPTED_ADMIN = "PASSWORD_ACCEPTED_ADMIN"
@@ -56,12 +102,14 @@ class BackendEndpoint(WebSocketEndpoint):
         self.player: Player = app.state.player
         self.videos: VideosStore = app.state.videos
 
+    @validate_command(lambda value: isinstance(value, str))
     def command_play(self, video_request):
         self.player.request_video(video_request)
 
     def command_play_random(self, _):
         self.player.request_random_video()
 
+    @validate_command(lambda value: isinstance(value, str))
     def command_download(self, url):
         run_in_background(self.player.request_url(url))
 
@@ -75,6 +123,7 @@ class BackendEndpoint(WebSocketEndpoint):
         await self.player.play_pause()
 
     @admins_only_command
+    @validate_command(lambda value: isinstance(value, dict) and isinstance(value.get("filename"), str))
     async def command_update(self, kwargs):
         filename = kwargs.pop("filename")
         kwargs = {camel_to_underscore(k): v for k, v in kwargs.items()}
@@ -86,6 +135,7 @@ class BackendEndpoint(WebSocketEndpoint):
 
     @admins_only_command
     @wants_websocket_command
+    @validate_command(lambda value: isinstance(value, (list, tuple)) and len(value) == 2)
     async def command_search_imdb(self, websocket: WebSocket, path_title):
         path, title = path_title
         results = await search_imdb(title)
@@ -94,13 +144,24 @@ class BackendEndpoint(WebSocketEndpoint):
             await self.player.notify(
                 single_websocket=websocket, type="alert", message="No results on IMDB found!", level="error"
             )
-        await websocket.send_json(convert_obj_to_camel(response))
+        await self.player.broadcast(response, (websocket,))
+
+    @wants_websocket_command
+    async def command_videos_resync(self, websocket: WebSocket, _):
+        await self.player.send_videos_snapshot(websocket)
 
-    async def command_seek(self, seconds):
-        await self.player.seek(seconds)
+    @wants_websocket_command
+    @validate_command(lambda value: isinstance(value, bool) or is_number(value) or value is None)
+    def command_watch_progress(self, websocket: WebSocket, value):
+        self.player.watch_progress(websocket, value)
+
+    @validate_command(is_number)
+    def command_seek(self, seconds):
+        self.player.seek(seconds)
 
-    async def command_position(self, seconds):
-        await self.player.set_position(seconds)
+    @validate_command(is_number)
+    def command_position(self, seconds):
+        self.player.set_position(seconds)
 
     async def on_receive_unauthorized(self, websocket: WebSocket, text: str):
         is_user, self.is_admin = verify_password(text)
@@ -116,17 +177,19 @@ class BackendEndpoint(WebSocketEndpoint):
 
     async def on_receive_authorized(self, websocket: WebSocket, data: dict):
         if isinstance(data, dict):
-            for command, value in data.items():
-                command = camel_to_underscore(command)
-                method = getattr(self, f"command_{command}", None)
-                if method is not None and (not getattr(method, "_admin_only", False) or self.is_admin):
-                    args = (websocket, value) if getattr(method, "_wants_websocket", False) else (value,)
-                    if asyncio.iscoroutinefunction(method):
-                        await method(*args)
-                    else:
-                        method(*args)
+            for name, value in data.items():
+                command = self.COMMANDS.get(name)
+                if command is None or (command.admin_only and not self.is_admin):
+                    logger.warning(f"Invalid command (admin={self.is_admin}): {name}")
+                elif command.validator is not None and not command.validator(value):
+                    logger.warning(f"Invalid argument for command {name}: {value!r}")
                 else:
-                    logger.warning(f"Invalid command (admin={self.is_admin}): {command}")
+                    args = (self, websocket, value) if command.wants_websocket else (self, value)
+                    with metrics.command_seconds.time(command=name):
+                        if command.is_async:
+                            await command.handler(*args)
+                        else:
+                            command.handler(*args)
         else:
             logger.warning(f"Invalid JSON data: {data}")
 
@@ -136,11 +199,14 @@ class BackendEndpoint(WebSocketEndpoint):
         else:
             await self.on_receive_unauthorized(websocket, text=data)
 
+    async def on_disconnect(self, websocket: WebSocket, close_code: int):
+        if self.authorized:
+            self.player.disconnect_websocket(websocket)
+
 
 async def startup():
     init_pkg_logger()
 
-    app.state.authorized_websockets = weakref.WeakSet()
     videos = app.state.videos = VideosStore(app)
     player = app.state.player = Player(app)
     remote = app.state.remote = Remote(app)
@@ -148,15 +214,18 @@ async def startup():
     await videos.startup()
     await player.startup()
     await remote.startup()
+    run_in_background(auto_restart_coroutine(metrics.log_summary_periodically))
 
 
 def shutdown():
-    app.state.player.kill_blocking()
+    app.state.player.shutdown()
+    app.state.videos.shutdown()
     cancel_all_background_tasks()
 
 
 routes = [
     WebSocketRoute("/backend", endpoint=BackendEndpoint),
+    Route("/metrics", endpoint=metrics_endpoint),
     Route("/{rest:path}", endpoint=index),
 ]
 
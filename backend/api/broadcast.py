@@ -0,0 +1,152 @@
+import asyncio
+from collections import deque
+import logging
+import time
+
+from . import metrics
+from .util import encode_message
+
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastMessage:
+    __slots__ = ("state", "is_snapshot", "text")
+
+    def __init__(self, message: dict, is_state: bool = False, is_snapshot: bool = False):
+        # Keep state-only messages around as dicts, so a backed up client's queue can be coalesced
+        self.state = message if is_state else None
+        # Catalog snapshots are the base every later delta applies to, so they're never dropped
+        self.is_snapshot = is_snapshot
+        self.text = encode_message(message)
+
+
+class BroadcastClient:
+    def __init__(self, broadcaster, websocket):
+        self.broadcaster = broadcaster
+        self.websocket = websocket
+        self.queue = deque()
+        self.has_messages = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    def put(self, message: BroadcastMessage):
+        if len(self.queue) >= self.broadcaster.MAX_QUEUE_SIZE:
+            self.make_room()
+        self.queue.append(message)
+        self.has_messages.set()
+
+    def make_room(self):
+        stats = self.broadcaster.stats
+        state_messages = [message for message in self.queue if message.state is not None]
+
+        if len(state_messages) > 1:
+            # Merge all queued state messages into the oldest one's slot (newer values win), so the merged state is
+            # still sent before anything that was queued after the first state change
+            merged = {}
+            for message in state_messages:
+                merged.update(message.state)
+            oldest = state_messages[0]
+            self.queue = deque(
+                BroadcastMessage(merged, is_state=True) if message is oldest else message
+                for message in self.queue
+                if message.state is None or message is oldest
+            )
+            stats["coalesced"] += len(state_messages) - 1
+
+        else:
+            # Drop the oldest notification or catalog delta, but never the only pending state message or a catalog
+            # snapshot, since nothing would send them again. Clients detect a dropped catalog delta and resync.
+            for i, message in enumerate(self.queue):
+                if message.state is None and not message.is_snapshot:
+                    del self.queue[i]
+                    stats["dropped"] += 1
+                    break
+
+    async def run(self):
+        stats = self.broadcaster.stats
+
+        while True:
+            await self.has_messages.wait()
+
+            while self.queue:
+                message = self.queue.popleft()
+                send_task = asyncio.create_task(self.websocket.send_text(message.text))
+                slow_sends = 0
+
+                # Don't cancel a slow send (it could leave a partially written frame), just keep waiting on it
+                while not (await asyncio.wait({send_task}, timeout=self.broadcaster.SEND_TIMEOUT))[0]:
+                    slow_sends += 1
+                    stats["slow_sends"] += 1
+                    if slow_sends >= self.broadcaster.MAX_SLOW_SENDS:
+                        send_task.cancel()
+                        await self.broadcaster.evict(self.websocket)
+                        return
+
+                try:
+                    send_task.result()
+                except Exception:
+                    logger.exception("Couldn't write to websocket")
+                    stats["errors"] += 1
+                    self.broadcaster.remove(self.websocket)
+                    return
+                else:
+                    stats["sent"] += 1
+
+            self.has_messages.clear()
+
+
+class Broadcaster:
+    MAX_QUEUE_SIZE = 32
+    SEND_TIMEOUT = 2.0
+    MAX_SLOW_SENDS = 5  # Evict a client after being stuck for MAX_SLOW_SENDS * SEND_TIMEOUT seconds
+    EVICT_CLOSE_CODE = 1013  # Try again later
+
+    def __init__(self):
+        self.clients = {}
+        self.stats = {"sent": 0, "dropped": 0, "coalesced": 0, "slow_sends": 0, "errors": 0, "evicted": 0}
+
+    def __len__(self):
+        return len(self.clients)
+
+    def add(self, websocket):
+        if websocket not in self.clients:
+            self.clients[websocket] = BroadcastClient(self, websocket)
+
+    def remove(self, websocket):
+        client = self.clients.pop(websocket, None)
+        if client is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    async def evict(self, websocket):
+        logger.warning(f"Evicting slow websocket client (stats: {self.get_stats()})")
+        self.stats["evicted"] += 1
+        self.remove(websocket)
+        try:
+            await asyncio.wait_for(websocket.close(code=self.EVICT_CLOSE_CODE), timeout=self.SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    def broadcast(self, message: dict, websockets=None, is_state=False, is_snapshot=False):
+        broadcast_start = time.monotonic()
+        # Encode exactly once, no matter how many clients are listening
+        message = BroadcastMessage(message, is_state=is_state, is_snapshot=is_snapshot)
+        if websockets is None:
+            clients = self.clients.values()
+        else:
+            clients = [client for websocket in websockets if (client := self.clients.get(websocket)) is not None]
+
+        for client in clients:
+            client.put(message)
+
+        metrics.broadcast_seconds.observe(time.monotonic() - broadcast_start)
+        metrics.broadcast_recipients.observe(len(clients))
+        metrics.broadcast_bytes.inc(len(message.text) * len(clients))
+
+    def get_stats(self):
+        queue_depths = [len(client.queue) for client in self.clients.values()]
+        return {
+            "clients": len(queue_depths),
+            "queue_depth": sum(queue_depths),
+            "max_queue_depth": max(queue_depths, default=0),
+            **self.stats,
+        }
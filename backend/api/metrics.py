@@ -0,0 +1,167 @@
+import asyncio
+import bisect
+from contextlib import contextmanager
+import logging
+import math
+import time
+
+
+logger = logging.getLogger(__name__)
+
+LOG_SUMMARY_INTERVAL = 300.0
+PREFIX = "pitv"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+_METRICS = {}
+_STATS_COLLECTORS = []
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [*zip(labelnames, values), *extra]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = f"{PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # Tuple of label values -> value
+        _METRICS[self.name] = self
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(f"{name}_total", documentation, labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        yield from super().render()
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+    def summarize(self):
+        return f"{sum(self._values.values())}" if self._values else None
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        counts = self._values.get(key)
+        if counts is None:
+            # Per bucket (non-cumulative) counts, with a final slot for +Inf, then the sum
+            counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def render(self):
+        yield from super().render()
+        for key, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (("le", _format_value(bound)),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+    def summarize(self):
+        count = sum(sum(counts[:-1]) for counts in self._values.values())
+        if not count:
+            return None
+        total = sum(counts[-1] for counts in self._values.values())
+        return f"n={count} avg={total / count:.4g}"
+
+
+def register_stats(name, get_stats, gauges=()):
+    """Export an existing stats dict (ie broadcaster.stats) at scrape time. Keys not in gauges are counters."""
+    _STATS_COLLECTORS.append((f"{PREFIX}_{name}", get_stats, frozenset(gauges)))
+
+
+def render():
+    lines = []
+    for metric in _METRICS.values():
+        lines.extend(metric.render())
+    for name, get_stats, gauges in _STATS_COLLECTORS:
+        for key, value in get_stats().items():
+            metric_type = "gauge" if key in gauges else "counter"
+            metric_name = f"{name}_{key}" if key in gauges else f"{name}_{key}_total"
+            lines.append(f"# TYPE {metric_name} {metric_type}")
+            lines.append(f"{metric_name} {_format_value(value)}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def log_summary():
+    summary = [f"{name}: {text}" for name, metric in _METRICS.items() if (text := metric.summarize()) is not None]
+    for name, get_stats, _ in _STATS_COLLECTORS:
+        summary.append(f"{name}: {', '.join(f'{key}={value}' for key, value in get_stats().items())}")
+    logger.info(f"Metrics summary -- {'; '.join(summary)}")
+
+
+async def log_summary_periodically():
+    while True:
+        await asyncio.sleep(LOG_SUMMARY_INTERVAL)
+        log_summary()
+
+
+# Metrics shared across modules are defined here, so there's exactly one of each
+command_seconds = Histogram("command_seconds", "Websocket command dispatch latency", ("command",))
+coroutine_restarts = Counter("coroutine_restarts", "Auto-restarted coroutine failures", ("coroutine",))
+broadcast_seconds = Histogram("broadcast_seconds", "Time to encode and queue a broadcast for all recipients")
+broadcast_recipients = Histogram("broadcast_recipients", "Clients each broadcast was queued for", buckets=SIZE_BUCKETS)
+broadcast_bytes = Counter("broadcast_bytes", "Bytes queued for clients, counted once per recipient")
+dbus_call_seconds = Histogram("dbus_call_seconds", "D-Bus call latency to the player", ("member",))
+player_spawn_seconds = Histogram("player_spawn_seconds", "Time to spawn the player process")
+player_first_response_seconds = Histogram(
+    "player_first_response_seconds", "Time from spawning the player to it first answering a status query"
+)
+player_request_to_first_frame_seconds = Histogram(
+    "player_request_to_first_frame_seconds", "Time from a video being requested to its player first answering"
+)
+player_stop_seconds = Histogram("player_stop_seconds", "Time to stop the player process")
+videos_save_seconds = Histogram("videos_save_seconds", "Time to write videos data to storage")
+videos_watch_batch_size = Histogram(
+    "videos_watch_batch_size", "Filesystem changes per batch seen by watch_for_videos", buckets=SIZE_BUCKETS
+)
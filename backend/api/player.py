@@ -1,35 +1,55 @@
 import asyncio
-from collections import defaultdict
-import datetime
 import logging
+import math
+import os
 from pathlib import Path
 import random
 import re
 import shutil
-import subprocess
 import time
 
-from dbus_next import Message as DBusMessage, MessageType as DBusMessageType
-from dbus_next.aio import MessageBus as DBusMessageBus
-
-from . import settings
-from .util import convert_obj_to_camel, SingletonBaseClass
+from . import metrics, settings
+from .broadcast import Broadcaster
+from .player_backends import get_player_backend
+from .positions import PositionsStore
+from .seeking import SeekScheduler
+from .util import convert_obj_to_camel, run_in_background, SingletonBaseClass
 from .videos import VideosStore
 
 
 logger = logging.getLogger(__name__)
 
 
+class PlaybackProgress:
+    """Last known playback position, extrapolated locally using a monotonic clock."""
+
+    def __init__(self, filename, position, duration, paused):
+        self.filename = filename
+        self.duration = duration
+        self.sync(position, paused)
+
+    def sync(self, position, paused=None):
+        self.synced_position = position
+        self.synced_time = time.monotonic()
+        if paused is not None:
+            self.paused = paused
+
+    @property
+    def position(self):
+        position = self.synced_position
+        if not self.paused:
+            position += time.monotonic() - self.synced_time
+        return min(position, self.duration) if self.duration > 0 else position
+
+
 class Player(SingletonBaseClass):
-    DBUS_BUS_ADDRESS_PATH = Path("/tmp/omxplayerdbus.root")
-    DBUS_PROC_NAME = "dbus-daemon"
-    DBUS_LOADING_SLEEP_TIME = 0.5
     DOWNLOAD_RE = re.compile(r"^\[download\]\s*([0-9\.]+)")
-    PLAYER_PATH = shutil.which("omxplayer")
-    PLAYER_PROC_NAMES = ["omxplayer", "omxplayer.bin"]
-    PUSH_PROGRESS_SLEEP_TIME = 0.25
+    PUSH_PROGRESS_SLEEP_TIME = 0.25  # When someone is watching progress (or we're waiting on the player)
+    PUSH_PROGRESS_IDLE_SLEEP_TIME = 5.0  # When nobody is watching progress
+    PROGRESS_RESYNC_TIME = 10.0  # Re-query position from the player at most this often, extrapolate in between
     BETWEEN_VIDEOS_SLEEP_TIME_RANGE = (1.5, 8.5)  # make sure max is updated in ui.py
-    KILL_SLEEP_TIME = 0.2
+    PREWARM_DELAY = 5.0  # Wait for the player to finish its own startup reads before reading ahead
+    READAHEAD_BYTES = 16 * 1024 * 1024
     TASKS = ("run_player", "push_progress")
     VIDEOS_DIR = settings.VIDEOS_DIR
     YT_DLP_PATH = shutil.which("yt-dlp")
@@ -37,16 +57,32 @@ class Player(SingletonBaseClass):
     def __init__(self, app):
         super().__init__(app)
 
-        self._dbus_message_bus = None
+        self.backend = get_player_backend(on_status_push=self._handle_status_push)
         self.videos: VideosStore = self.app.state.videos
-        self.websockets = app.state.authorized_websockets
+        self.broadcaster = Broadcaster()
+        self.seek_scheduler = SeekScheduler(self)
         self.stop_playing_event = asyncio.Event()
         self.next_video_request = None
         self.show_extra_static = False
-        self.positions = defaultdict(int)
+        self._next_random_video = None  # Picked ahead of time, so it can be pre-warmed
+        self._next_random_time_left = None  # Time left to fill the next random video was picked for
+        self._prewarmed = set()  # Filenames pre-warmed while the current video plays
+        self._request_time = None  # For measuring key press to first frame latency
+        self._spawn_time = None  # For measuring spawn to first status response latency
+        metrics.register_stats(
+            "broadcast", self.broadcaster.get_stats, gauges=("clients", "queue_depth", "max_queue_depth")
+        )
+        metrics.register_stats("positions", lambda: self.positions.stats)
+        metrics.register_stats("seeks", lambda: self.seek_scheduler.stats)
+        if hasattr(self.backend, "stats"):
+            metrics.register_stats("player", lambda: self.backend.stats)
+        self.positions = PositionsStore()
+        self._progress = None
+        self._progress_needs_resync = True
+        self._progress_wake = asyncio.Event()
+        self._progress_watchers = {}  # websocket -> monotonic deadline
         self._state = {
             # JS object style keys
-            "videos": self.videos.as_json(),
             "currently_playing": None,
             "download": None,
             "position": None,
@@ -57,47 +93,23 @@ class Player(SingletonBaseClass):
             "muted": self.videos._muted,
         }
 
-    async def _kill(self, signal: int):
-        proc = await asyncio.create_subprocess_exec(
-            "killall",
-            "-s",
-            signal,
-            *self.PLAYER_PROC_NAMES,
-            stdout=asyncio.subprocess.DEVNULL,
-            stderr=asyncio.subprocess.DEVNULL,
-        )
-        await proc.wait()
-
-    def _kill_blocking(self, signal: int):
-        proc_names = list(self.PLAYER_PROC_NAMES)
-        if settings.DEBUG:
-            proc_names.append(self.DBUS_PROC_NAME)
-        subprocess.run(
-            ["killall", "-s", signal] + proc_names,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-
-    async def kill(self):
-        logger.info("Killing omxplayer with SIGINT + SIGKILL")
-        await self._kill("SIGINT")
-        await asyncio.sleep(self.KILL_SLEEP_TIME)
-        await self._kill("SIGKILL")
-
     def kill_blocking(self):
-        logger.info("Killing omxplayer with SIGINT + SIGKILL (blocking)")
-        self._kill_blocking("SIGINT")
-        time.sleep(self.KILL_SLEEP_TIME)
-        self._kill_blocking("SIGKILL")
+        self.backend.stop_blocking()
+
+    def shutdown(self):
+        self.kill_blocking()
+        self.positions.flush_blocking()
 
     async def startup(self):
-        await self.kill()
+        await self.backend.kill_all()
+        run_in_background(self.positions.load())
         await super().startup()
 
     def request_video(self, filename):
         video = self.videos.get(filename)
         if video is not None:
             logger.info(f"Requesting video: {video.filename}")
+            self._request_time = time.monotonic()
             self.next_video_request = video
             self.stop_playing_event.set()
         else:
@@ -158,6 +170,7 @@ class Player(SingletonBaseClass):
 
     def request_random_video(self):
         logger.info("Requesting random video")
+        self._request_time = time.monotonic()
         self.show_extra_static = True
         self.stop_playing_event.set()
 
@@ -174,160 +187,255 @@ class Player(SingletonBaseClass):
                         self._state[key] = message[key] = value
                 else:
                     logger.error(f"Invalid player state key: {key}")
-            websockets = self.websockets
 
+            if message:
+                await self.broadcast(message, is_state=True)
+
+        else:
+            # On first message, send extras (title) and a full snapshot of the catalog
+            self.broadcaster.add(authorize_websocket)
+            message = {"title": settings.TITLE, **self._state, **self.videos.as_snapshot()}
+            await self.broadcast(message, (authorize_websocket,), is_snapshot=True)
+
+    def disconnect_websocket(self, websocket):
+        self.broadcaster.remove(websocket)
+        self._progress_watchers.pop(websocket, None)
+
+    def watch_progress(self, websocket, value):
+        # True means watch indefinitely, a number is a lease in seconds, and anything false stops watching
+        if value is True:
+            self._progress_watchers[websocket] = math.inf
+        elif value:
+            self._progress_watchers[websocket] = time.monotonic() + float(value)
         else:
-            websockets = (authorize_websocket,)
-            # On first message, send extras (title)
-            message = {"title": settings.TITLE, **self._state}
+            self._progress_watchers.pop(websocket, None)
+        self._progress_wake.set()
 
-        if message:
-            message = convert_obj_to_camel(message)
-            for websocket in websockets:
-                try:
-                    await websocket.send_json(message)
-                except Exception:
-                    logger.exception("Couldn't write to websocket")
+    def is_progress_watched(self):
+        now = time.monotonic()
+        self._progress_watchers = {ws: deadline for ws, deadline in self._progress_watchers.items() if deadline > now}
+        return bool(self._progress_watchers)
 
-        if authorize_websocket is not None:
-            self.websockets.add(websocket)
+    def request_progress_resync(self):
+        self._progress_needs_resync = True
+        self._progress_wake.set()
 
-    async def notify(self, type, single_websocket=None, **kwargs):
-        if single_websocket is None:
-            websockets = self.websockets
-        else:
-            websockets = (single_websocket,)
+    async def send_videos_snapshot(self, websocket):
+        logger.info("Sending full catalog snapshot for resync")
+        await self.broadcast(self.videos.as_snapshot(), (websocket,), is_snapshot=True)
 
+    async def notify(self, type, single_websocket=None, **kwargs):
         message = {"type": type}
         message.update(kwargs)
-        message = convert_obj_to_camel({"notify": message})
-        for websocket in websockets:
-            try:
-                await websocket.send_json(message)
-            except Exception:
-                logger.exception("Couldn't write to websocket")
-
-    async def get_dbus_message_bus(self):
-        if self._dbus_message_bus is None:
-            while self._dbus_message_bus is None:
-                while not self.DBUS_BUS_ADDRESS_PATH.exists():
-                    logger.info("waiting for dbus address file")
-                    await asyncio.sleep(self.DBUS_LOADING_SLEEP_TIME)
-
-                with open(self.DBUS_BUS_ADDRESS_PATH, "r") as file:
-                    bus_address = file.read().strip()
-
-                try:
-                    self._dbus_message_bus = await DBusMessageBus(bus_address).connect()
-                except ConnectionRefusedError:
-                    logger.warning("dbus connection refused")
-                    await asyncio.sleep(self.DBUS_LOADING_SLEEP_TIME)
-                else:
-                    logger.info("dbus connection succeeded")
-
-        return self._dbus_message_bus
-
-    async def _dbus_helper(self, member, signature="", body=None):
-        bus = await self.get_dbus_message_bus()
-        return await bus.call(
-            DBusMessage(
-                destination="org.mpris.MediaPlayer2.omxplayer",
-                path="/org/mpris/MediaPlayer2",
-                interface="org.freedesktop.DBus.Properties" if member == "Get" else "org.mpris.MediaPlayer2.Player",
-                member=member,
-                signature=signature,
-                body=body or [],
-            )
+        await self.broadcast({"notify": message}, None if single_websocket is None else (single_websocket,))
+
+    async def broadcast(self, message, websockets=None, is_state=False, is_snapshot=False):
+        # Queues message for each client without waiting on them, so a slow client can't stall the others
+        self.broadcaster.broadcast(
+            convert_obj_to_camel(message), websockets, is_state=is_state, is_snapshot=is_snapshot
         )
 
-    async def seek(self, seconds):
-        await self._dbus_helper("Seek", "x", [round(seconds * 1000000)])
-        await self.notify("seek")
+    def _handle_status_push(self, position=None, paused=None):
+        if self._progress is None:
+            return
+
+        if position is None and paused is None:
+            self.request_progress_resync()
+        else:
+            self._progress.sync(self._progress.position if position is None else position, paused)
+            self._progress_wake.set()
+
+    def sync_progress_from_status(self, status):
+        if status is not None and self._progress is not None:
+            self._progress.sync(status.position, status.paused)
+            self._progress_wake.set()
+        else:
+            self.request_progress_resync()
+
+    def seek(self, seconds):
+        self.seek_scheduler.seek(seconds)
 
-    async def set_position(self, seconds):
-        await self._dbus_helper("SetPosition", "ox", ["/not/used", round(seconds * 1000000)])
-        await self.notify("seek")
+    def set_position(self, seconds):
+        self.seek_scheduler.set_position(seconds)
 
     async def play_pause(self):
-        await self._dbus_helper("PlayPause")
+        status = await self.backend.play_pause()
+        self.sync_progress_from_status(status)
         await self.notify("playPause")
+        return status
+
+    async def sync_progress(self, filename):
+        # Duration is only needed once per video, after that only position and playback status
+        progress = self._progress if self._progress is not None and self._progress.filename == filename else None
+        status = await self.backend.get_status(with_duration=progress is None)
+        if status is None:
+            return None
+
+        if progress is None:
+            progress = PlaybackProgress(filename, status.position, status.duration, status.paused)
+            if self._spawn_time is not None:
+                first_response_time = time.monotonic() - self._spawn_time
+                metrics.player_first_response_seconds.observe(first_response_time)
+                logger.info(f"Player responded {first_response_time:.3f}s after spawn")
+                self._spawn_time = None
+            if self._request_time is not None:
+                # Player answering a status query is the closest thing we have to knowing its first frame is up
+                first_frame_time = time.monotonic() - self._request_time
+                metrics.player_request_to_first_frame_seconds.observe(first_frame_time)
+                logger.info(f"Request to first frame latency: {first_frame_time:.3f}s")
+                self._request_time = None
+            if self.backend.REPORTS_REAL_DURATION:
+                await self.videos.update_video(filename, duration=progress.duration)
+        else:
+            progress.sync(status.position, status.paused)
+        return progress
 
     async def push_progress(self):
-        while True:
-            state = {}
-            error = False
-
-            for member in ("Position", "Duration", "PlaybackStatus"):
-                reply = await self._dbus_helper("Get", "ss", ["org.mpris.MediaPlayer2.Player", member])
-
-                if reply.message_type == DBusMessageType.METHOD_RETURN:
-                    if member == "PlaybackStatus":
-                        state.update(
-                            {
-                                "playing": True,
-                                "paused": reply.body[0] == "Paused",
-                            }
-                        )
-                    else:
-                        state[member.lower()] = round(reply.body[0] / 1000000)
-                else:
-                    error = True
+        next_resync_time = 0
 
-            if error:
+        while True:
+            self._progress_wake.clear()
+            currently_playing = self.get_state("currently_playing")
+
+            if currently_playing is None:
+                self._progress = None
+            elif (
+                self._progress is None
+                or self._progress.filename != currently_playing
+                or self._progress_needs_resync
+                or time.monotonic() >= next_resync_time
+            ):
+                self._progress_needs_resync = False
+                self._progress = await self.sync_progress(currently_playing)
+                next_resync_time = time.monotonic() + self.PROGRESS_RESYNC_TIME
+
+            if self._progress is None:
                 state = {"position": None, "duration": None, "playing": False, "paused": False}
             else:
-                currently_playing = self.get_state("currently_playing")
-                duration = datetime.timedelta(seconds=state["duration"])
-                self.positions[currently_playing] = max(state["position"] - 1, 0)  # A second of buffer here
-                await self.videos.update_video(currently_playing, duration=duration)
+                position = round(self._progress.position)
+                self.positions[currently_playing] = max(position - 1, 0)  # A second of buffer here
+                state = {
+                    "position": position,
+                    "duration": round(self._progress.duration),
+                    "playing": True,
+                    "paused": self._progress.paused,
+                }
 
             await self.set_state(**state)
-            await asyncio.sleep(self.PUSH_PROGRESS_SLEEP_TIME)
+
+            if self.is_progress_watched() or (self._progress is None and currently_playing is not None):
+                sleep_time = self.PUSH_PROGRESS_SLEEP_TIME
+            else:
+                sleep_time = self.PUSH_PROGRESS_IDLE_SLEEP_TIME
+
+            try:
+                await asyncio.wait_for(self._progress_wake.wait(), timeout=sleep_time)
+            except asyncio.TimeoutError:
+                pass
+
+    def get_next_video(self):
+        if self.next_video_request is not None:
+            video, self.next_video_request = self.next_video_request, None
+            return video
+
+        # Picked early on in the previous video, so it could have been played since (ie requested explicitly), or
+        # stopped fitting in the time left (ie the previous video was skipped)
+        video, self._next_random_video = self._next_random_video, None
+        time_left, fits = self.get_fill_time_left(), self.videos.selector.fits
+        if (
+            video is None
+            or not self.videos.is_random_eligible(video)
+            or (fits(video, self._next_random_time_left) and not fits(video, time_left))
+        ):
+            video = self.videos.random(max_duration=time_left)
+        return video
 
     @staticmethod
-    async def get_omxplayer_size_args():
-        if any((settings.OVERSCAN_TOP, settings.OVERSCAN_RIGHT, settings.OVERSCAN_BOTTOM, settings.OVERSCAN_LEFT)):
-            dim_proc = await asyncio.create_subprocess_exec("vcgencmd", "get_lcd_info", stdout=asyncio.subprocess.PIPE)
-            dims, _ = await dim_proc.communicate()
-            if dim_proc.returncode != 0:
-                raise Exception("Error getting screen dimensions!")
-            width, height, _ = map(int, dims.decode("utf-8").strip().split())
-            logger.info(f"Got screen dimensions: {width}x{height}")
-
-            top, left = settings.OVERSCAN_TOP, settings.OVERSCAN_LEFT
-            bottom, right = height - settings.OVERSCAN_BOTTOM, width - settings.OVERSCAN_RIGHT
-            return ["--win", f"{left} {top} {right} {bottom}"]
-        else:
-            return ["--aspect-mode", "stretch"]
+    def get_fill_time_left(starting_in=0.0):
+        """Seconds between the next video starting and the end of the RANDOM_FILL_BLOCK_MINUTES block it starts in,
+        or None if random videos aren't picked to fill blocks."""
+        block = settings.RANDOM_FILL_BLOCK_MINUTES * 60
+        if block <= 0:
+            return None
+        start = time.time() + starting_in
+        local = time.localtime(start)
+        into_hour = local.tm_min * 60 + local.tm_sec + start % 1
+        return block - into_hour % block
+
+    @staticmethod
+    def readahead_blocking(path, length):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, length, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        except OSError:
+            logger.exception(f"Error reading ahead {path}")
+
+    async def prewarm(self, filename):
+        # Pull the start of the likeliest next videos (neighbouring channels, next random pick) into the page cache
+        await asyncio.sleep(self.PREWARM_DELAY)
+        if self.get_state("currently_playing") != filename or not self.videos:
+            return
+
+        index = self.videos.index(filename)
+        predicted = [self.videos[self.videos.filename_at_index(index + direction)] for direction in (1, -1)]
+        if self._next_random_video is None:
+            # Filling starts once this one ends
+            progress = self._progress
+            if progress is not None and progress.filename == filename and progress.duration > 0:
+                playing_for = progress.duration - progress.position
+            else:
+                playing_for = self.videos[filename].duration
+            self._next_random_time_left = self.get_fill_time_left(playing_for)
+            self._next_random_video = self.videos.random(max_duration=self._next_random_time_left)
+        if self._next_random_video is not None:
+            predicted.append(self._next_random_video)
+
+        loop = asyncio.get_running_loop()
+        for video in predicted:
+            if video.filename not in self._prewarmed:
+                self._prewarmed.add(video.filename)
+                await loop.run_in_executor(None, self.readahead_blocking, video.path, self.READAHEAD_BYTES)
+        logger.info(f"Pre-warmed next videos: {', '.join(video.filename for video in predicted)}")
+
+    async def _teardown(self, proc_wait_task):
+        teardown_start = time.monotonic()
+        await self.backend.stop()
+        await proc_wait_task
+        stop_time = time.monotonic() - teardown_start
+        metrics.player_stop_seconds.observe(stop_time)
+        logger.info(f"Player stopped in {stop_time:.3f}s")
 
     async def run_player(self):
-        size_args = await self.get_omxplayer_size_args()
+        await self.backend.setup()
 
         while True:
-            if self.next_video_request is None:
-                video = self.videos.random()
-            else:
-                video = self.next_video_request
-                self.next_video_request = None
+            video = self.get_next_video()
 
             if video is not None:
-                position = self.positions[video.filename]
-                args = [self.PLAYER_PATH, "--no-osd", "--adev", "alsa", "--layer", "0"] + size_args
-                if position > 0:
-                    args.extend(["--pos", str(position)])
-                args.append(video.path)
-                proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.DEVNULL)
+                spawn_start = time.monotonic()
+                proc = await self.backend.spawn(video, self.positions[video.filename])
                 proc_start_time = time.time()
-                logger.info(f"Player started: {video.filename}")
+                self._spawn_time = time.monotonic()
+                metrics.player_spawn_seconds.observe(self._spawn_time - spawn_start)
+                logger.info(f"Player started in {self._spawn_time - spawn_start:.3f}s: {video.filename}")
+                self.videos.mark_played(video)
+                self._prewarmed.clear()  # Pages pre-warmed during earlier videos may well be evicted by now
                 await self.set_state(currently_playing=video.filename)
+                self.request_progress_resync()
                 await self.notify("newVideo")
+                run_in_background(self.prewarm(video.filename))
 
                 wait_tasks = {
                     (proc_wait_task := asyncio.create_task(proc.wait())),
                     (stop_playing_wait_task := asyncio.create_task(self.stop_playing_event.wait())),
                 }
                 _, pending = await asyncio.wait(wait_tasks, return_when=asyncio.FIRST_COMPLETED)
+                self.seek_scheduler.reset()
                 await self.set_state(currently_playing=None)
+                self._progress_wake.set()
 
                 if stop_playing_wait_task in pending:
                     # Rather than cancel the task (doesn't seem to work), manually trigger it being done
@@ -340,10 +448,12 @@ class Player(SingletonBaseClass):
                 show_extra_static = self.show_extra_static
                 self.show_extra_static = False
 
+                teardown_task = None
                 if proc_wait_task in pending:
-                    await self.kill()
-                    await proc_wait_task
-                else:  # Omxplayer exitted
+                    # Players claim fixed D-Bus names / IPC sockets, so the next one can't be spawned until this one's
+                    # gone. Overlap teardown with the static between videos instead.
+                    teardown_task = asyncio.create_task(self._teardown(proc_wait_task))
+                else:  # Player exitted
                     self.positions[video.filename] = 0  # Reset position back to zero
                     if proc.returncode != 0:
                         proc_end_time = time.time()
@@ -361,6 +471,9 @@ class Player(SingletonBaseClass):
                     logger.info(f"{video.filename} ended. Sleeping for {sleep_seconds:.3f}s")
                     await asyncio.sleep(sleep_seconds)
 
+                if teardown_task is not None:
+                    await teardown_task
+
                 logger.info("Player exited. Restarting")
 
             else:
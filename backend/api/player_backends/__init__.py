@@ -0,0 +1,20 @@
+from .. import settings
+from .base import PlayerBackend, PlayerStatus
+from .fake import FakePlayerBackend
+from .mpv import MPVPlayerBackend
+from .omxplayer import OMXPlayerBackend
+
+
+PLAYER_BACKENDS = {
+    "omxplayer": OMXPlayerBackend,
+    "mpv": MPVPlayerBackend,
+    "fake": FakePlayerBackend,
+}
+
+
+def get_player_backend(on_status_push):
+    try:
+        backend_cls = PLAYER_BACKENDS[settings.PLAYER_BACKEND]
+    except KeyError:
+        raise Exception(f"Invalid PLAYER_BACKEND: {settings.PLAYER_BACKEND}. Choices: {', '.join(PLAYER_BACKENDS)}")
+    return backend_cls(on_status_push)
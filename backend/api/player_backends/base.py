@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import time
+import typing
+
+from .. import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerStatus(typing.NamedTuple):
+    position: float
+    duration: typing.Optional[float]  # None if not requested
+    paused: bool
+
+
+def has_overscan():
+    return any((settings.OVERSCAN_TOP, settings.OVERSCAN_RIGHT, settings.OVERSCAN_BOTTOM, settings.OVERSCAN_LEFT))
+
+
+async def get_screen_dimensions():
+    dim_proc = await asyncio.create_subprocess_exec("vcgencmd", "get_lcd_info", stdout=asyncio.subprocess.PIPE)
+    dims, _ = await dim_proc.communicate()
+    if dim_proc.returncode != 0:
+        raise Exception("Error getting screen dimensions!")
+    width, height, _ = map(int, dims.decode("utf-8").strip().split())
+    logger.info(f"Got screen dimensions: {width}x{height}")
+    return width, height
+
+
+async def killall(signal_name, proc_names):
+    proc = await asyncio.create_subprocess_exec(
+        "killall",
+        "-s",
+        signal_name,
+        *proc_names,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    await proc.wait()
+
+
+def killall_blocking(signal_name, proc_names):
+    subprocess.run(
+        ["killall", "-s", signal_name] + list(proc_names),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+class PlayerBackend:
+    """Interface between Player and the program actually playing videos. Only one video plays at a time.
+
+    Backends that get pushed updates (signals, events) report them by calling on_status_push(position=None,
+    paused=None) with whatever they know. Calling it with neither means the last known status is stale."""
+
+    REPORTS_REAL_DURATION = True  # Whether durations from get_status() are the file's, and can be saved to videos
+
+    def __init__(self, on_status_push):
+        self.on_status_push = on_status_push
+
+    async def setup(self):
+        """Called once before the first spawn()."""
+        pass
+
+    async def kill_all(self):
+        """Kill any stray players, ie left over from a previous run."""
+        pass
+
+    async def spawn(self, video, position=0):
+        """Start playing video. Returns a process-like object with an async wait() and a returncode attribute."""
+        raise NotImplementedError()
+
+    async def stop(self):
+        """Stop the current video, if any. The process returned by spawn() should be done when this returns."""
+        raise NotImplementedError()
+
+    def stop_blocking(self):
+        """Stop the current video on shutdown, when the event loop can't be relied on."""
+        pass
+
+    async def get_status(self, with_duration=True):
+        """Returns a PlayerStatus, or None if nothing is playing (yet)."""
+        raise NotImplementedError()
+
+    async def seek(self, seconds):
+        """Seek relative to the current position. Returns the resulting PlayerStatus (without duration) or None."""
+        raise NotImplementedError()
+
+    async def set_position(self, seconds):
+        raise NotImplementedError()
+
+    async def play_pause(self):
+        raise NotImplementedError()
+
+
+class SubprocessPlayerBackend(PlayerBackend):
+    """Backend for a player running as a child process. It gets its own process group, so stopping it reaches any
+    processes it spawned too, without resorting to matching process names."""
+
+    STOP_SIGNAL = signal.SIGINT
+    STOP_TIMEOUT_FACTOR = 3.0  # Wait this many times the average stop time before escalating to SIGKILL
+    STOP_TIMEOUT_RANGE = (0.25, 3.0)
+    STOP_TIME_EWMA_WEIGHT = 0.2
+    STOP_BLOCKING_POLL_TIME = 0.01
+
+    def __init__(self, on_status_push):
+        super().__init__(on_status_push)
+
+        self._proc = None
+        self._average_stop_time = None
+        self.stats = {"stops": 0, "stop_escalations": 0}
+
+    async def spawn_process(self, *args):
+        self._proc = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.DEVNULL, start_new_session=True
+        )
+        return self._proc
+
+    def get_stop_timeout(self):
+        min_timeout, max_timeout = self.STOP_TIMEOUT_RANGE
+        if self._average_stop_time is None:
+            return max_timeout
+        return min(max(self._average_stop_time * self.STOP_TIMEOUT_FACTOR, min_timeout), max_timeout)
+
+    def _record_stop_time(self, stop_time):
+        if self._average_stop_time is None:
+            self._average_stop_time = stop_time
+        else:
+            weight = self.STOP_TIME_EWMA_WEIGHT
+            self._average_stop_time = weight * stop_time + (1 - weight) * self._average_stop_time
+
+    def _signal_process_group(self, proc, signum):
+        try:
+            os.killpg(proc.pid, signum)
+        except ProcessLookupError:
+            pass  # Already gone
+
+    async def stop(self):
+        proc = self._proc
+        if proc is None or proc.returncode is not None:
+            return
+
+        stop_start = time.monotonic()
+        timeout = self.get_stop_timeout()
+        self._signal_process_group(proc, self.STOP_SIGNAL)
+        try:
+            # Shielded so the timeout doesn't cancel the wait for anyone else waiting on the process
+            await asyncio.wait_for(asyncio.shield(proc.wait()), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Player didn't exit {timeout:.3f}s after {self.STOP_SIGNAL.name}, sending SIGKILL")
+            self.stats["stop_escalations"] += 1
+            self._signal_process_group(proc, signal.SIGKILL)
+            await proc.wait()
+
+        self.stats["stops"] += 1
+        self._record_stop_time(time.monotonic() - stop_start)
+
+    def stop_blocking(self):
+        proc = self._proc
+        if proc is None or proc.returncode is not None:
+            return
+
+        logger.info(f"Stopping player with {self.STOP_SIGNAL.name} (blocking)")
+        self._signal_process_group(proc, self.STOP_SIGNAL)
+        deadline = time.monotonic() + self.get_stop_timeout()
+        while time.monotonic() < deadline:
+            try:
+                os.killpg(proc.pid, 0)
+            except ProcessLookupError:
+                return
+            time.sleep(self.STOP_BLOCKING_POLL_TIME)
+
+        logger.warning(f"Player didn't exit after {self.STOP_SIGNAL.name}, sending SIGKILL (blocking)")
+        self._signal_process_group(proc, signal.SIGKILL)
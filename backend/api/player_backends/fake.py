@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+from .base import PlayerBackend, PlayerStatus
+
+
+class FakePlayerProcess:
+    """Stands in for a player subprocess. Plays for the video's duration on a monotonic clock."""
+
+    def __init__(self, duration, position):
+        self.duration = duration
+        self.returncode = None
+        self.paused = False
+        self._synced_position = position
+        self._synced_time = time.monotonic()
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def position(self):
+        position = self._synced_position
+        if not self.paused:
+            position += time.monotonic() - self._synced_time
+        return min(position, self.duration)
+
+    def set_position(self, position):
+        self._synced_position = max(0, min(position, self.duration))
+        self._synced_time = time.monotonic()
+        self._changed.set()
+
+    def play_pause(self):
+        self.set_position(self.position)
+        self.paused = not self.paused
+
+    def stop(self):
+        if self.returncode is None:
+            self.returncode = 0
+            self._changed.set()
+
+    async def _run(self):
+        while self.returncode is None:
+            self._changed.clear()
+            timeout = None if self.paused else self.duration - self.position
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.returncode = 0  # Played to the end
+
+    async def wait(self):
+        await self._task
+        return self.returncode
+
+
+class FakePlayerBackend(PlayerBackend):
+    """In-process player that plays nothing, for running the backend (and load testing it) without a display."""
+
+    COMMAND_LATENCY = 0.001
+    DEFAULT_DURATION = 30.0  # For videos that haven't been probed
+    REPORTS_REAL_DURATION = False  # Made up for unprobed videos, so never save them
+    SPAWN_TIME = 0.05
+
+    def __init__(self, on_status_push):
+        super().__init__(on_status_push)
+        self._proc = None
+
+    def _playing(self):
+        return self._proc is not None and self._proc.returncode is None
+
+    async def spawn(self, video, position=0):
+        await asyncio.sleep(self.SPAWN_TIME)
+        duration = video.duration or self.DEFAULT_DURATION
+        self._proc = FakePlayerProcess(duration, position)
+        return self._proc
+
+    async def stop(self):
+        if self._proc is not None:
+            self._proc.stop()
+            await self._proc.wait()
+
+    def stop_blocking(self):
+        if self._proc is not None:
+            self._proc.stop()
+
+    async def get_status(self, with_duration=True):
+        await asyncio.sleep(self.COMMAND_LATENCY)
+        if not self._playing():
+            return None
+        return PlayerStatus(
+            position=self._proc.position,
+            duration=self._proc.duration if with_duration else None,
+            paused=self._proc.paused,
+        )
+
+    async def seek(self, seconds):
+        if self._playing():
+            self._proc.set_position(self._proc.position + seconds)
+            self.on_status_push(position=self._proc.position)
+        return await self.get_status(with_duration=False)
+
+    async def set_position(self, seconds):
+        if self._playing():
+            self._proc.set_position(seconds)
+            self.on_status_push(position=self._proc.position)
+        return await self.get_status(with_duration=False)
+
+    async def play_pause(self):
+        if self._playing():
+            self._proc.play_pause()
+            self.on_status_push(paused=self._proc.paused)
+        return await self.get_status(with_duration=False)
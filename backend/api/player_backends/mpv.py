@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+from pathlib import Path
+import shutil
+import time
+
+from .. import settings
+from .base import get_screen_dimensions, has_overscan, killall, PlayerStatus, SubprocessPlayerBackend
+
+
+logger = logging.getLogger(__name__)
+
+
+class MPVPlayerBackend(SubprocessPlayerBackend):
+    COMMAND_TIMEOUT = 2.0
+    IPC_CONNECT_SLEEP_TIME = 0.05
+    IPC_CONNECT_TIMEOUT = 5.0
+    IPC_SOCKET_PATH = Path("/tmp/mpv-pitv.sock")
+    PLAYER_PATH = shutil.which("mpv")
+    PLAYER_PROC_NAMES = ["mpv"]
+    PAUSE_OBSERVER_ID = 1
+
+    def __init__(self, on_status_push):
+        super().__init__(on_status_push)
+
+        self._player_args = None
+        self._writer = None
+        self._read_task = None
+        self._connect_lock = asyncio.Lock()
+        self._request_id = 0
+        self._pending_requests = {}  # request_id -> future
+
+    @staticmethod
+    async def get_mpv_size_args():
+        if has_overscan():
+            width, height = await get_screen_dimensions()
+            return [
+                f"--video-margin-ratio-left={settings.OVERSCAN_LEFT / width}",
+                f"--video-margin-ratio-right={settings.OVERSCAN_RIGHT / width}",
+                f"--video-margin-ratio-top={settings.OVERSCAN_TOP / height}",
+                f"--video-margin-ratio-bottom={settings.OVERSCAN_BOTTOM / height}",
+                "--keepaspect=no",
+            ]
+        else:
+            return ["--keepaspect=no"]
+
+    async def setup(self):
+        self._player_args = [
+            self.PLAYER_PATH,
+            f"--input-ipc-server={self.IPC_SOCKET_PATH}",
+            "--fullscreen",
+            "--no-terminal",
+            "--no-osc",
+            "--osd-level=0",
+            "--no-input-default-bindings",
+            "--ao=alsa",
+        ]
+        self._player_args.extend(await self.get_mpv_size_args())
+
+    async def spawn(self, video, position=0):
+        self._disconnect()
+        self.IPC_SOCKET_PATH.unlink(missing_ok=True)  # So a stale socket isn't mistaken for the new player's
+
+        args = list(self._player_args)
+        if position > 0:
+            args.append(f"--start={position}")
+        args.append(str(video.path))
+        return await self.spawn_process(*args)
+
+    async def kill_all(self):
+        logger.info("Killing stray mpvs with SIGKILL")
+        await killall("SIGKILL", self.PLAYER_PROC_NAMES)
+
+    async def stop(self):
+        await super().stop()
+        self._disconnect()
+
+    async def _connect(self):
+        async with self._connect_lock:
+            deadline = time.monotonic() + self.IPC_CONNECT_TIMEOUT
+            while self._writer is None:
+                if self._proc is None or self._proc.returncode is not None or time.monotonic() >= deadline:
+                    return False
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.IPC_SOCKET_PATH)
+                except (FileNotFoundError, ConnectionRefusedError):
+                    await asyncio.sleep(self.IPC_CONNECT_SLEEP_TIME)
+                else:
+                    logger.info("mpv IPC connection succeeded")
+                    self._writer = writer
+                    self._read_task = asyncio.create_task(self._read_messages(reader))
+                    self._send(["observe_property", self.PAUSE_OBSERVER_ID, "pause"])
+        return True
+
+    def _disconnect(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for future in self._pending_requests.values():
+            if not future.done():
+                future.set_result({"error": "disconnected"})
+        self._pending_requests.clear()
+
+    async def _read_messages(self, reader):
+        while line := await reader.readline():
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Invalid message from mpv: {line!r}")
+                continue
+
+            if "request_id" in message:
+                future = self._pending_requests.pop(message["request_id"], None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+            elif message.get("event") == "property-change" and message.get("id") == self.PAUSE_OBSERVER_ID:
+                if message.get("data") is not None:
+                    self.on_status_push(paused=message["data"])
+            elif message.get("event") in ("seek", "playback-restart"):
+                self.on_status_push()
+
+        # mpv closed the socket (exited)
+        self._read_task = None
+        self._disconnect()
+
+    def _send(self, command):
+        self._request_id += 1
+        future = self._pending_requests[self._request_id] = asyncio.get_running_loop().create_future()
+        self._writer.write(json.dumps({"command": command, "request_id": self._request_id}).encode("utf-8") + b"\n")
+        return self._request_id, future
+
+    async def _command(self, *command):
+        """Returns the command's data, or None if it failed or mpv isn't running."""
+        if self._writer is None and not await self._connect():
+            return None
+
+        request_id, future = self._send(list(command))
+        try:
+            reply = await asyncio.wait_for(future, timeout=self.COMMAND_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._pending_requests.pop(request_id, None)
+            return None
+        if reply.get("error") != "success":
+            logger.debug(f"mpv command {command} failed: {reply.get('error')}")
+            return None
+        return reply.get("data", True)
+
+    async def get_status(self, with_duration=True):
+        # Requests are pipelined over the socket, and answered in order
+        properties = ("time-pos", "pause", "duration") if with_duration else ("time-pos", "pause")
+        values = await asyncio.gather(*(self._command("get_property", prop) for prop in properties))
+        if any(value is None for value in values):
+            return None
+
+        return PlayerStatus(
+            position=values[0],
+            duration=values[2] if with_duration else None,
+            paused=values[1],
+        )
+
+    async def _command_with_status(self, *command):
+        # Queue the status query right behind the command, so it reflects the command's result in one round trip
+        _, status = await asyncio.gather(self._command(*command), self.get_status(with_duration=False))
+        return status
+
+    async def seek(self, seconds):
+        return await self._command_with_status("seek", seconds, "relative")
+
+    async def set_position(self, seconds):
+        return await self._command_with_status("seek", seconds, "absolute")
+
+    async def play_pause(self):
+        return await self._command_with_status("cycle", "pause")
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+from pathlib import Path
+import shutil
+
+from dbus_next import Message as DBusMessage, MessageType as DBusMessageType, Variant as DBusVariant
+from dbus_next.aio import MessageBus as DBusMessageBus
+
+from .. import metrics, settings
+from .base import get_screen_dimensions, has_overscan, killall, killall_blocking, PlayerStatus, SubprocessPlayerBackend
+
+
+logger = logging.getLogger(__name__)
+
+
+def unwrap_dbus_variant(value):
+    # omxplayer returns bare values for property Gets, but other MPRIS players (correctly) return variants
+    return value.value if isinstance(value, DBusVariant) else value
+
+
+class OMXPlayerBackend(SubprocessPlayerBackend):
+    DBUS_BUS_ADDRESS_PATH = Path("/tmp/omxplayerdbus.root")
+    DBUS_PROC_NAME = "dbus-daemon"
+    DBUS_LOADING_SLEEP_TIME = 0.1
+    DBUS_DESTINATION = "org.mpris.MediaPlayer2.omxplayer"
+    DBUS_SERVICE_UNKNOWN_ERROR = "org.freedesktop.DBus.Error.ServiceUnknown"
+    DBUS_UNSUPPORTED_ERRORS = ("org.freedesktop.DBus.Error.UnknownMethod", "org.freedesktop.DBus.Error.NotSupported")
+    DBUS_PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+    DBUS_PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+    DBUS_SIGNAL_MATCH_RULES = (
+        "type='signal',path='/org/mpris/MediaPlayer2',interface='org.freedesktop.DBus.Properties',"
+        "member='PropertiesChanged'",
+        "type='signal',path='/org/mpris/MediaPlayer2',interface='org.mpris.MediaPlayer2.Player',member='Seeked'",
+    )
+    KILL_SLEEP_TIME = 0.2
+    PLAYER_PATH = shutil.which("omxplayer")
+    PLAYER_PROC_NAMES = ["omxplayer", "omxplayer.bin"]
+
+    def __init__(self, on_status_push):
+        super().__init__(on_status_push)
+
+        self._dbus_message_bus = None
+        self._dbus_message_templates = {}
+        self._dbus_get_all_supported = True
+        self._player_args = None
+
+    @staticmethod
+    async def get_omxplayer_size_args():
+        if has_overscan():
+            width, height = await get_screen_dimensions()
+            top, left = settings.OVERSCAN_TOP, settings.OVERSCAN_LEFT
+            bottom, right = height - settings.OVERSCAN_BOTTOM, width - settings.OVERSCAN_RIGHT
+            return ["--win", f"{left} {top} {right} {bottom}"]
+        else:
+            return ["--aspect-mode", "stretch"]
+
+    async def setup(self):
+        # Spawn arguments other than the video itself are prepared once
+        self._player_args = [self.PLAYER_PATH, "--no-osd", "--adev", "alsa", "--layer", "0"]
+        self._player_args.extend(await self.get_omxplayer_size_args())
+
+    async def spawn(self, video, position=0):
+        args = list(self._player_args)
+        if position > 0:
+            args.extend(["--pos", str(position)])
+        args.append(video.path)
+        return await self.spawn_process(*args)
+
+    async def kill_all(self):
+        # Only needed for orphans from a previous run, players we spawn are stopped through their process group
+        logger.info("Killing stray omxplayers with SIGINT + SIGKILL")
+        await killall("SIGINT", self.PLAYER_PROC_NAMES)
+        await asyncio.sleep(self.KILL_SLEEP_TIME)
+        await killall("SIGKILL", self.PLAYER_PROC_NAMES)
+
+    def stop_blocking(self):
+        super().stop_blocking()
+        if settings.DEBUG:
+            killall_blocking("SIGKILL", [self.DBUS_PROC_NAME])
+
+    async def get_dbus_message_bus(self):
+        if self._dbus_message_bus is None:
+            while self._dbus_message_bus is None:
+                while not self.DBUS_BUS_ADDRESS_PATH.exists():
+                    logger.info("waiting for dbus address file")
+                    await asyncio.sleep(self.DBUS_LOADING_SLEEP_TIME)
+
+                with open(self.DBUS_BUS_ADDRESS_PATH, "r") as file:
+                    bus_address = file.read().strip()
+
+                try:
+                    bus = await DBusMessageBus(bus_address).connect()
+                except ConnectionRefusedError:
+                    logger.warning("dbus connection refused")
+                    await asyncio.sleep(self.DBUS_LOADING_SLEEP_TIME)
+                else:
+                    logger.info("dbus connection succeeded")
+                    await self.subscribe_to_dbus_signals(bus)
+                    self._dbus_message_bus = bus
+
+        return self._dbus_message_bus
+
+    async def subscribe_to_dbus_signals(self, bus):
+        bus.add_message_handler(self._handle_dbus_signal)
+        for rule in self.DBUS_SIGNAL_MATCH_RULES:
+            await bus.call(
+                DBusMessage(
+                    destination="org.freedesktop.DBus",
+                    path="/org/freedesktop/DBus",
+                    interface="org.freedesktop.DBus",
+                    member="AddMatch",
+                    signature="s",
+                    body=[rule],
+                )
+            )
+
+    def _handle_dbus_signal(self, message):
+        if message.message_type != DBusMessageType.SIGNAL:
+            return
+
+        if message.member == "Seeked":
+            self.on_status_push(position=unwrap_dbus_variant(message.body[0]) / 1000000)
+        elif message.member == "PropertiesChanged":
+            _, changed, _ = message.body
+            if "PlaybackStatus" in changed:
+                self.on_status_push(paused=unwrap_dbus_variant(changed["PlaybackStatus"]) == "Paused")
+            else:
+                self.on_status_push()
+
+    def _get_dbus_message_template(self, member, signature):
+        template = self._dbus_message_templates.get((member, signature))
+        if template is None:
+            template = self._dbus_message_templates[(member, signature)] = {
+                "destination": self.DBUS_DESTINATION,
+                "path": "/org/mpris/MediaPlayer2",
+                "interface": (
+                    self.DBUS_PROPERTIES_INTERFACE if member in ("Get", "GetAll") else self.DBUS_PLAYER_INTERFACE
+                ),
+                "member": member,
+                "signature": signature,
+            }
+        return template
+
+    async def _dbus_helper(self, member, signature="", body=None):
+        bus = await self.get_dbus_message_bus()
+        with metrics.dbus_call_seconds.time(member=member):
+            # Messages can't be reused outright, since the bus assigns each one a serial
+            return await bus.call(DBusMessage(**self._get_dbus_message_template(member, signature), body=body or []))
+
+    async def _get_status_with_get_all(self):
+        reply = await self._dbus_helper("GetAll", "s", [self.DBUS_PLAYER_INTERFACE])
+        if reply.message_type == DBusMessageType.METHOD_RETURN:
+            props = {key: unwrap_dbus_variant(value) for key, value in reply.body[0].items()}
+            duration = props.get("Duration")
+            if duration is None and (length := props.get("Metadata", {}).get("mpris:length")) is not None:
+                duration = unwrap_dbus_variant(length)
+            if "Position" in props and "PlaybackStatus" in props and duration is not None:
+                return PlayerStatus(
+                    position=props["Position"] / 1000000,
+                    duration=duration / 1000000,
+                    paused=props["PlaybackStatus"] == "Paused",
+                )
+
+        elif reply.error_name == self.DBUS_SERVICE_UNKNOWN_ERROR:
+            return None  # Player not running (yet)
+
+        elif reply.error_name not in self.DBUS_UNSUPPORTED_ERRORS:
+            # ie a timeout while the player is busy, so GetAll is tried again on the next query
+            logger.warning(f"GetAll status query failed: {reply.error_name}")
+            return None
+
+        logger.info("Player doesn't fully support GetAll, falling back to concurrent Gets")
+        self._dbus_get_all_supported = False
+        return await self.get_status()
+
+    async def get_status(self, with_duration=True):
+        if self._dbus_get_all_supported:
+            return await self._get_status_with_get_all()
+
+        # Issue property Gets concurrently, pipelined over the same connection
+        members = ("Position", "PlaybackStatus", "Duration") if with_duration else ("Position", "PlaybackStatus")
+        replies = await asyncio.gather(
+            *(self._dbus_helper("Get", "ss", [self.DBUS_PLAYER_INTERFACE, member]) for member in members)
+        )
+        if any(reply.message_type != DBusMessageType.METHOD_RETURN for reply in replies):
+            return None
+
+        values = dict(zip(members, (unwrap_dbus_variant(reply.body[0]) for reply in replies)))
+        return PlayerStatus(
+            position=values["Position"] / 1000000,
+            duration=values["Duration"] / 1000000 if with_duration else None,
+            paused=values["PlaybackStatus"] == "Paused",
+        )
+
+    async def _dbus_command_with_status(self, member, signature="", body=None):
+        # Queue the status query right behind the command, so it reflects the command's result in one round trip
+        _, status = await asyncio.gather(
+            self._dbus_helper(member, signature, body), self.get_status(with_duration=False)
+        )
+        return status
+
+    async def seek(self, seconds):
+        return await self._dbus_command_with_status("Seek", "x", [round(seconds * 1000000)])
+
+    async def set_position(self, seconds):
+        return await self._dbus_command_with_status("SetPosition", "ox", ["/not/used", round(seconds * 1000000)])
+
+    async def play_pause(self):
+        return await self._dbus_command_with_status("PlayPause")
@@ -0,0 +1,161 @@
+import asyncio
+from collections.abc import MutableMapping
+import json
+import logging
+import os
+import threading
+import time
+
+from . import settings
+from .util import run_in_background
+
+
+logger = logging.getLogger(__name__)
+
+
+class PositionsStore(MutableMapping):
+    """Resume positions by filename, acting like a defaultdict(int). Changes are batched in memory and appended to
+    a log file periodically, so the write rate is bounded no matter how often positions are updated."""
+
+    LOG_PATH = settings.VIDEOS_DIR / ".positions.log"
+    LOG_PATH_TMP = LOG_PATH.parent / f"{LOG_PATH.stem}.tmp.log"
+    DATA_FILES = (LOG_PATH, LOG_PATH_TMP)
+    FLUSH_INTERVAL = 30.0  # Appends to SD card happen at most once per this many seconds
+    COMPACT_MIN_LINES = 1000
+    COMPACT_RATIO = 4  # Rewrite the log once it's this many times longer than the number of positions it holds
+
+    def __init__(self):
+        self._positions = None  # Loaded lazily
+        self._pending = {}  # Changed since last flush
+        self._log_lines = 0
+        self._flush_timer = None
+        self._load_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.stats = {"updates": 0, "flushes": 0, "compactions": 0}
+
+    def _load_blocking(self):
+        with self._load_lock:
+            if self._positions is not None:
+                return
+
+            load_start = time.monotonic()
+            positions, lines = {}, 0
+            try:
+                with open(self.LOG_PATH, "rb") as file:
+                    contents = file.read()
+            except FileNotFoundError:
+                contents = b""
+
+            if contents and not contents.endswith(b"\n"):
+                # Crashed mid-append. Drop the partial line, so the next append doesn't get glued onto it.
+                logger.warning(f"Truncating partially written last line of {self.LOG_PATH}")
+                contents = contents[: contents.rfind(b"\n") + 1]
+                os.truncate(self.LOG_PATH, len(contents))
+
+            for line in contents.splitlines():
+                try:
+                    filename, position = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping corrupt line in {self.LOG_PATH}: {line!r}")
+                    continue
+                lines += 1
+                if position > 0:
+                    positions[filename] = position
+                else:
+                    positions.pop(filename, None)
+
+            self._log_lines = lines
+            self._positions = positions
+            logger.info(
+                f"Loaded {len(positions)} resume positions from {lines} log lines in"
+                f" {time.monotonic() - load_start:.3f}s"
+            )
+
+    async def load(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._load_blocking)
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._load_blocking()  # Only if accessed before load() finished
+        return self._positions
+
+    def __getitem__(self, filename):
+        return self.positions.get(filename, 0)
+
+    def __setitem__(self, filename, position):
+        if self[filename] == position:
+            return
+
+        if position > 0:
+            self.positions[filename] = position
+        else:
+            self.positions.pop(filename, None)
+        self._pending[filename] = position
+        self.stats["updates"] += 1
+        if self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(
+                self.FLUSH_INTERVAL, lambda: run_in_background(self.flush())
+            )
+
+    def __delitem__(self, filename):
+        self[filename] = 0
+
+    def __contains__(self, filename):
+        return filename in self.positions
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _get_write_args(self):
+        pending, self._pending = self._pending, {}
+        self._log_lines += len(pending)
+        if self._log_lines > max(self.COMPACT_MIN_LINES, self.COMPACT_RATIO * len(self.positions)):
+            self._log_lines = len(self.positions)
+            return pending, dict(self.positions)  # Snapshot taken on the event loop, so it's consistent
+        return pending, None
+
+    def _write_blocking(self, pending, compact_snapshot):
+        with self._write_lock:
+            try:
+                if compact_snapshot is not None:
+                    with open(self.LOG_PATH_TMP, "w") as file:
+                        file.writelines(f"{json.dumps([k, v])}\n" for k, v in compact_snapshot.items())
+                        file.flush()
+                        os.fsync(file.fileno())
+                    os.rename(self.LOG_PATH_TMP, self.LOG_PATH)  # Atomic operation (write to temp file first)
+                    self.stats["compactions"] += 1
+                    logger.info(f"Compacted resume positions log to {len(compact_snapshot)} lines")
+                else:
+                    with open(self.LOG_PATH, "a") as file:
+                        file.writelines(f"{json.dumps([k, v])}\n" for k, v in pending.items())
+                        file.flush()
+                        os.fsync(file.fileno())
+            except Exception:
+                logger.exception(f"Error writing resume positions to {self.LOG_PATH}")
+                return False
+
+            self.stats["flushes"] += 1
+            return True
+
+    async def flush(self):
+        self._flush_timer = None
+        if self._pending:
+            pending, compact_snapshot = self._get_write_args()
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(None, self._write_blocking, pending, compact_snapshot):
+                for filename, position in pending.items():  # Try again later, unless there's a newer value
+                    self._pending.setdefault(filename, position)
+                if self._flush_timer is None:
+                    self._flush_timer = loop.call_later(self.FLUSH_INTERVAL, lambda: run_in_background(self.flush()))
+
+    def flush_blocking(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._pending:
+            self._write_blocking(*self._get_write_args())
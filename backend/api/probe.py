@@ -0,0 +1,253 @@
+import asyncio
+import json
+import shutil
+import struct
+
+
+FFPROBE_PATH = shutil.which("ffprobe")
+MP4_FTYP = b"ftyp"
+MKV_EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+MKV_SEGMENT = 0x18538067
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_CODEC_ID = 0x86
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_CLUSTER = 0x1F43B675
+
+
+class ProbeError(Exception):
+    pass
+
+
+def _new_info():
+    return {"duration": 0, "video_codec": None, "audio_codec": None, "width": None, "height": None}
+
+
+def _iter_mp4_boxes(file, start, end):
+    offset = start
+    while offset + 8 <= end:
+        file.seek(offset)
+        size, box_type = struct.unpack(">I4s", file.read(8))
+        header_size = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", file.read(8))
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            raise ProbeError(f"Invalid MP4 box size for {box_type!r}")
+        if offset + size > end:
+            raise ProbeError(f"MP4 box {box_type!r} extends past its parent, file is truncated or corrupt")
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _find_mp4_box(file, start, end, *path):
+    for box_type, box_start, box_end in _iter_mp4_boxes(file, start, end):
+        if box_type == path[0]:
+            return (box_start, box_end) if len(path) == 1 else _find_mp4_box(file, box_start, box_end, *path[1:])
+    return None
+
+
+def _probe_mp4_track(file, start, end, info):
+    if (hdlr := _find_mp4_box(file, start, end, b"mdia", b"hdlr")) is None:
+        return
+    file.seek(hdlr[0] + 8)  # version/flags + pre_defined
+    handler_type = file.read(4)
+
+    codec = None
+    if (stsd := _find_mp4_box(file, start, end, b"mdia", b"minf", b"stbl", b"stsd")) is not None:
+        file.seek(stsd[0] + 12)  # version/flags + entry count + first entry size
+        codec = file.read(4).decode("ascii", errors="replace").strip()
+
+    if handler_type == b"vide" and info["video_codec"] is None:
+        info["video_codec"] = codec
+        if (tkhd := _find_mp4_box(file, start, end, b"tkhd")) is not None:
+            file.seek(tkhd[0])
+            version = file.read(1)[0]
+            file.seek(tkhd[0] + (88 if version == 1 else 76))  # Offset of 16.16 fixed point width, height
+            width, height = struct.unpack(">II", file.read(8))
+            info["width"], info["height"] = width >> 16, height >> 16
+    elif handler_type == b"soun" and info["audio_codec"] is None:
+        info["audio_codec"] = codec
+
+
+def probe_mp4(file, file_size):
+    if (moov := _find_mp4_box(file, 0, file_size, b"moov")) is None:
+        raise ProbeError("No moov box in MP4")
+
+    info = _new_info()
+    for box_type, start, end in _iter_mp4_boxes(file, *moov):
+        if box_type == b"mvhd":
+            file.seek(start)
+            version = file.read(1)[0]
+            if version == 1:
+                file.seek(start + 20)
+                timescale, duration = struct.unpack(">IQ", file.read(12))
+            else:
+                file.seek(start + 12)
+                timescale, duration = struct.unpack(">II", file.read(8))
+            if timescale > 0:
+                info["duration"] = duration / timescale
+        elif box_type == b"trak":
+            _probe_mp4_track(file, start, end, info)
+    return info
+
+
+def _read_ebml_vint(file, keep_marker):
+    first = file.read(1)
+    if not first:
+        raise ProbeError("Unexpected end of MKV file")
+    value, length, mask = first[0], 1, 0x80
+    while not value & mask:
+        mask >>= 1
+        length += 1
+        if length > 8:
+            raise ProbeError("Invalid MKV variable length integer")
+    if not keep_marker:
+        value &= mask - 1
+    for byte in file.read(length - 1):
+        value = (value << 8) | byte
+    return value, length
+
+
+def _iter_ebml_elements(file, start, end):
+    offset = start
+    while offset < end:
+        file.seek(offset)
+        element_id, id_length = _read_ebml_vint(file, keep_marker=True)
+        size, size_length = _read_ebml_vint(file, keep_marker=False)
+        data_start = offset + id_length + size_length
+        if size == (1 << (7 * size_length)) - 1:  # Unknown size, extends to end of parent
+            size = end - data_start
+        if data_start + size > end:
+            raise ProbeError(f"MKV element {element_id:#x} extends past its parent, file is truncated or corrupt")
+        yield element_id, data_start, data_start + size
+        offset = data_start + size
+
+
+def _read_ebml_uint(file, start, end):
+    file.seek(start)
+    return int.from_bytes(file.read(end - start), "big")
+
+
+def probe_mkv(file, file_size):
+    info = _new_info()
+    timecode_scale, duration = 1000000, 0
+
+    for element_id, start, end in _iter_ebml_elements(file, 0, file_size):
+        if element_id != MKV_SEGMENT:
+            continue
+
+        for element_id, start, end in _iter_ebml_elements(file, start, end):
+            if element_id == MKV_INFO:
+                for element_id, start, end in _iter_ebml_elements(file, start, end):
+                    if element_id == MKV_TIMECODE_SCALE:
+                        timecode_scale = _read_ebml_uint(file, start, end)
+                    elif element_id == MKV_DURATION:
+                        file.seek(start)
+                        (duration,) = struct.unpack(">f" if end - start == 4 else ">d", file.read(end - start))
+
+            elif element_id == MKV_TRACKS:
+                for element_id, start, end in _iter_ebml_elements(file, start, end):
+                    if element_id == MKV_TRACK_ENTRY:
+                        _probe_mkv_track(file, start, end, info)
+
+            elif element_id == MKV_CLUSTER:
+                break  # Header elements all come before the media data
+        break
+
+    info["duration"] = duration * timecode_scale / 1000000000
+    return info
+
+
+def _probe_mkv_track(file, start, end, info):
+    track_type, codec, width, height = None, None, None, None
+    for element_id, start, end in _iter_ebml_elements(file, start, end):
+        if element_id == MKV_TRACK_TYPE:
+            track_type = _read_ebml_uint(file, start, end)
+        elif element_id == MKV_CODEC_ID:
+            file.seek(start)
+            codec = file.read(end - start).rstrip(b"\x00").decode("ascii", errors="replace")
+        elif element_id == MKV_VIDEO:
+            for element_id, start, end in _iter_ebml_elements(file, start, end):
+                if element_id == MKV_PIXEL_WIDTH:
+                    width = _read_ebml_uint(file, start, end)
+                elif element_id == MKV_PIXEL_HEIGHT:
+                    height = _read_ebml_uint(file, start, end)
+
+    if track_type == 1 and info["video_codec"] is None:
+        info.update({"video_codec": codec, "width": width, "height": height})
+    elif track_type == 2 and info["audio_codec"] is None:
+        info["audio_codec"] = codec
+
+
+def probe_headers_blocking(path, file_size):
+    """Pure Python fallback for when ffprobe isn't installed. Returns None for unsupported containers."""
+    with open(path, "rb") as file:
+        magic = file.read(8)
+        try:
+            if magic[4:8] == MP4_FTYP:
+                return probe_mp4(file, file_size)
+            elif magic[:4] == MKV_EBML_MAGIC:
+                return probe_mkv(file, file_size)
+        except (struct.error, IndexError) as e:
+            raise ProbeError(f"Truncated or corrupt header: {e}")
+    return None
+
+
+def _parse_ffprobe_duration(value):
+    try:
+        return float(value or 0)
+    except ValueError:
+        return 0  # "N/A" when the container doesn't say, ie some streams and raw formats
+
+
+async def probe_with_ffprobe(path):
+    proc = await asyncio.create_subprocess_exec(
+        FFPROBE_PATH,
+        "-v",
+        "error",
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
+        str(path),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise ProbeError(f"ffprobe exited with code {proc.returncode}: {stderr.decode('utf-8', errors='replace')}")
+
+    data = json.loads(stdout)
+    info = _new_info()
+    info["duration"] = _parse_ffprobe_duration(data.get("format", {}).get("duration"))
+    for stream in data.get("streams", ()):
+        codec_type = stream.get("codec_type")
+        if codec_type == "video" and info["video_codec"] is None:
+            info.update(
+                {"video_codec": stream.get("codec_name"), "width": stream.get("width"), "height": stream.get("height")}
+            )
+        elif codec_type == "audio" and info["audio_codec"] is None:
+            info["audio_codec"] = stream.get("codec_name")
+    return info
+
+
+async def probe_video(path, file_size):
+    """Returns info dict, or None if the file couldn't be inspected. Raises ProbeError if it's unplayable."""
+    if FFPROBE_PATH is not None:
+        info = await probe_with_ffprobe(path)
+    else:
+        loop = asyncio.get_running_loop()
+        info = await loop.run_in_executor(None, probe_headers_blocking, path, file_size)
+
+    if info is not None and info["video_codec"] is None:
+        raise ProbeError("No video stream found")
+    return info
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 
+from . import settings
 from .player import Player
 from .util import SingletonBaseClass
 from .videos import VideosStore
@@ -19,6 +20,12 @@ class Remote(SingletonBaseClass):
         self.player: Player = app.state.player
         self.videos: VideosStore = app.state.videos
 
+    async def startup(self):
+        if settings.LIRC_ENABLED:
+            await super().startup()
+        else:
+            logger.info("lirc disabled, not listening for remote")
+
     async def readline(self) -> str:
         line = await self.reader.readline()
         if not line:
@@ -49,11 +56,11 @@ class Remote(SingletonBaseClass):
             logger.info(f"Got {button} press")
 
             if button == "KEY_RIGHT":
-                await self.player.seek(20)
+                self.player.seek(20)
             elif button == "KEY_LEFT":
-                await self.player.seek(-20)
+                self.player.seek(-20)
             elif button == "KEY_BACK":
-                await self.player.set_position(0)
+                self.player.set_position(0)
             elif button == "KEY_VOLUMEUP":
                 await self.videos.toggle_mute(value=False)
             elif button == "KEY_VOLUMEDOWN":
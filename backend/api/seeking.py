@@ -0,0 +1,68 @@
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class SeekScheduler:
+    """Merges bursts of seeks (dragging the slider, mashing remote buttons) into as few player seeks as possible.
+
+    Relative seeks add up, and an absolute position replaces anything requested before it. At most one seek is in
+    flight at a time, and a single notification goes out once they've all settled."""
+
+    COALESCE_TIME = 0.1  # Wait this long for more requests before sending a seek to the player
+
+    def __init__(self, player):
+        self.player = player
+        self._relative = 0
+        self._absolute = None
+        self._task = None
+        self.stats = {"requested": 0, "performed": 0}
+
+    def seek(self, seconds):
+        if self._absolute is not None:
+            self._absolute = max(self._absolute + seconds, 0)
+        else:
+            self._relative += seconds
+        self._schedule()
+
+    def set_position(self, seconds):
+        self._absolute = max(seconds, 0)
+        self._relative = 0
+        self._schedule()
+
+    def reset(self):
+        # Pending seeks were meant for the video that just stopped
+        self._relative = 0
+        self._absolute = None
+
+    def _schedule(self):
+        self.stats["requested"] += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        performed = False
+        try:
+            while True:
+                await asyncio.sleep(self.COALESCE_TIME)
+                absolute, relative = self._absolute, self._relative
+                if absolute is None and relative == 0:
+                    break
+
+                self.reset()
+                self.stats["performed"] += 1
+                performed = True
+                if absolute is not None:
+                    status = await self.player.backend.set_position(absolute)
+                else:
+                    status = await self.player.backend.seek(relative)
+                self.player.sync_progress_from_status(status)
+        except Exception:
+            logger.exception("Error seeking")
+        finally:
+            self._task = None
+
+        if performed:
+            await self.player.notify("seek")
@@ -0,0 +1,207 @@
+import bisect
+from collections import deque
+import logging
+import random
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class AliasTable:
+    """Vose's alias method. Building is O(n), picking is O(1)."""
+
+    def __init__(self, items, weights):
+        self.items = items
+        self.weights = weights
+        count = len(items)
+        total = sum(weights)
+        self._probabilities = [0.0] * count
+        self._aliases = [0] * count
+
+        scaled = [weight * count / total for weight in weights] if total > 0 else [1.0] * count
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probabilities[less] = scaled[less]
+            self._aliases[less] = more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        for i in small + large:  # Leftovers are 1.0, modulo floating point error
+            self._probabilities[i] = 1.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def pick_index(self):
+        i = random.randrange(len(self.items))
+        return i if random.random() < self._probabilities[i] else self._aliases[i]
+
+
+class SelectionPool:
+    """Videos eligible for one pool, kept up to date incrementally. Videos eligible when it was built are in an alias
+    table. Ones that become eligible later are appended to a side list, picked from in proportion to its share of the
+    total weight. Ones that stop being eligible stay where they are and are rejected when picked, until there are
+    enough of either that the owner rebuilds the pool."""
+
+    def __init__(self, videos, weights):
+        self.table = AliasTable(videos, weights)
+        self.table_weight = sum(weights)
+        self.added, self.added_weights, self.added_cumulative = [], [], []
+        self.placed = {video.filename: video for video in videos}  # filename -> video object entered into the pool
+        self.live = set(self.placed)  # Filenames whose placed video is still eligible
+        self.stale = 0  # Entries no longer eligible
+
+    def __len__(self):
+        return len(self.live)
+
+    @property
+    def needs_rebuild(self):
+        return self.stale + len(self.added) > max(len(self.table) // 4, 16)
+
+    def add(self, video, weight):
+        if self.placed.get(video.filename) is video:
+            if video.filename not in self.live:  # Eligible again, so its old entry is revived
+                self.live.add(video.filename)
+                self.stale -= 1
+            return
+
+        self.remove(video.filename)  # A replaced video's entry goes stale
+        self.placed[video.filename] = video
+        self.live.add(video.filename)
+        self.added.append(video)
+        self.added_weights.append(weight)
+        self.added_cumulative.append((self.added_cumulative[-1] if self.added_cumulative else 0.0) + weight)
+
+    def remove(self, filename):
+        if filename in self.live:
+            self.live.discard(filename)
+            self.stale += 1
+
+    def is_live(self, video):
+        return video.filename in self.live and self.placed[video.filename] is video
+
+    def pick(self):
+        """Returns a video (possibly stale) and the weight it was entered with, in proportion to those weights."""
+        added_weight = self.added_cumulative[-1] if self.added else 0.0
+        if added_weight > 0 and random.random() * (self.table_weight + added_weight) >= self.table_weight:
+            i = min(bisect.bisect_right(self.added_cumulative, random.random() * added_weight), len(self.added) - 1)
+            return self.added[i], self.added_weights[i]
+        i = self.table.pick_index()
+        return self.table.items[i], self.table.weights[i]
+
+    def videos(self):
+        return [self.placed[filename] for filename in self.live]
+
+
+class RandomSelector:
+    NEVER_WATCHED_BOOST = 3.0  # Never watched videos are this many times more likely to be picked
+    NO_REPEAT_WINDOW = 10  # Don't replay any of the last N played videos (capped by pool size)
+    RECENCY_PENALTY_TIME = 6 * 60 * 60  # Videos played within this many seconds are proportionally less likely
+    OVERRUN_WEIGHT = 0.1  # Videos longer than the time left to fill are this many times as likely to be picked
+    MAX_PICK_ATTEMPTS = 32
+
+    def __init__(self, videos):
+        self.videos = videos
+        self._pools = {}  # play_r_rated -> SelectionPool, built lazily
+        self._recent = deque(maxlen=self.NO_REPEAT_WINDOW)
+
+    def invalidate(self):
+        """Rebuild pools from scratch on the next pick."""
+        self._pools.clear()
+
+    def update(self, videos=(), removed=()):
+        """Keep built pools up to date with videos that were added, or changed whether they're eligible (r-rating or
+        unplayable), and removed filenames. Weights only ever go down once entered (never watched videos get watched),
+        which pick() accounts for by rejection, so other changes don't need updating."""
+        for play_r_rated, pool in list(self._pools.items()):
+            for filename in removed:
+                pool.remove(filename)
+            for video in videos:
+                if self._in_pool(video, play_r_rated):
+                    pool.add(video, self.get_weight(video))
+                else:
+                    pool.remove(video.filename)
+            if pool.needs_rebuild:
+                del self._pools[play_r_rated]
+
+    @staticmethod
+    def _in_pool(video, play_r_rated):
+        return not video.is_unplayable and (play_r_rated or not video.is_r_rated)
+
+    def get_weight(self, video):
+        return self.NEVER_WATCHED_BOOST if video.last_played is None else 1.0
+
+    def get_pool(self, play_r_rated):
+        pool = self._pools.get(play_r_rated)
+        if pool is None:
+            build_start = time.monotonic()
+            videos = [v for v in self.videos.values() if self._in_pool(v, play_r_rated)]
+            weights = [self.get_weight(v) for v in videos]
+            pool = self._pools[play_r_rated] = SelectionPool(videos, weights)
+            logger.info(
+                f"Built random selection pool of {len(pool)} videos (r-rated: {play_r_rated}) in"
+                f" {time.monotonic() - build_start:.3f}s"
+            )
+        return pool
+
+    def record_play(self, video):
+        self._recent.append(video.filename)
+
+    def _get_recent(self, pool):
+        # Window can't cover the whole pool, otherwise nothing would be eligible
+        return set(list(self._recent)[-(len(pool) - 1) :]) if len(pool) > 1 else set()
+
+    def is_eligible(self, video, play_r_rated=True):
+        """Whether a video picked earlier could still be picked now, ie nothing played it in the meantime."""
+        return (
+            self.videos.get(video.filename) is video
+            and self._in_pool(video, play_r_rated)
+            and video.filename not in self._get_recent(self.get_pool(play_r_rated))
+        )
+
+    @staticmethod
+    def fits(video, max_duration):
+        # Videos that haven't been probed yet have no duration, and are assumed to fit
+        return max_duration is None or video.duration <= max_duration
+
+    def _accept(self, video, pool, built_weight, recent, max_duration, now):
+        if not pool.is_live(video) or self.videos.get(video.filename) is not video:
+            return False  # Removed, replaced or no longer eligible since it was entered into the pool
+        if video.filename in recent:
+            return False
+        if (weight := self.get_weight(video)) < built_weight and random.random() >= weight / built_weight:
+            return False  # Watched since it was entered into the pool, so it's only picked with its current weight
+        if not self.fits(video, max_duration) and random.random() >= self.OVERRUN_WEIGHT:
+            return False
+        if video.last_played is not None and (since_played := now - video.last_played) < self.RECENCY_PENALTY_TIME:
+            return random.random() < since_played / self.RECENCY_PENALTY_TIME
+        return True
+
+    def pick(self, play_r_rated=True, max_duration=None):
+        """Weighted random pick. Videos longer than max_duration seconds (the time left to fill, if any) are picked
+        less often. O(1) expected time."""
+        pool = self.get_pool(play_r_rated)
+        if not pool:
+            return None
+
+        recent = self._get_recent(pool)
+        now = time.time()
+        for _ in range(self.MAX_PICK_ATTEMPTS):
+            video, built_weight = pool.pick()
+            if self._accept(video, pool, built_weight, recent, max_duration, now):
+                return video
+
+        # Rejection sampling gave up (tiny pool, or everything was played recently), so fall back to a linear scan
+        choices = [
+            video
+            for video in pool.videos()
+            if video.filename not in recent and self.videos.get(video.filename) is video
+        ]
+        if not choices:
+            return None
+        weights = [self.get_weight(v) * (1.0 if self.fits(v, max_duration) else self.OVERRUN_WEIGHT) for v in choices]
+        return random.choices(choices, weights)[0]
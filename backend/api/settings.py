@@ -11,12 +11,19 @@ conf = Config(ENVFILE)
 DEBUG = conf("DEBUG", cast=bool, default=False)
 ALSA_DEVICE = conf("ALSA_DEVICE", default="HDMI")
 INDEX_REDIRECT_URL = conf("REDIRECT_URL", default="https://jew.pizza/")
+LIRC_ENABLED = conf("LIRC_ENABLED", cast=bool, default=True)
+METRICS_TOKEN = conf("METRICS_TOKEN", cast=Secret, default="")  # /metrics is disabled unless this is set
 PASSWORD_ADMIN = conf("PASSWORD_ADMIN", cast=Secret)
 PASSWORD_USER = conf("PASSWORD_USER", cast=Secret)
+PLAYER_BACKEND = conf("PLAYER_BACKEND", default="omxplayer")  # "omxplayer", "mpv" or "fake"
 PLAYER_ERROR_TIMEOUT = conf("PLAYER_ERROR_TIMEOUT", cast=float, default=2.0)
 PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+# Random videos are picked to fit in the time left until the next multiple of this many minutes past the hour (ie
+# 30 fills half hour blocks, like TV). 0 to disable.
+RANDOM_FILL_BLOCK_MINUTES = conf("RANDOM_FILL_BLOCK_MINUTES", cast=int, default=0)
 TITLE = conf("TITLE", default="Raspberry Pi Video Player")
 VIDEOS_DIR = Path(conf("VIDEOS_DIR_OVERRIDE", default="/videos"))
+VIDEOS_STORAGE = conf("VIDEOS_STORAGE", default="json")  # "json" or "sqlite"
 
 OVERSCAN_LEFT = conf("OVERSCAN_LEFT", cast=int, default=0)
 OVERSCAN_RIGHT = conf("OVERSCAN_RIGHT", cast=int, default=0)
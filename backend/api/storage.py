@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import sqlite3
+
+from . import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class VideosStorage:
+    """Persistence backend for VideosStore. Everything except load() is called from a worker thread."""
+
+    FULL_REWRITE = False  # If True, save() expects the complete videos list in data["videos"]
+    DATA_FILES = ()
+
+    def load(self):
+        """Returns dict with keys play_r_rated, muted, videos (list of Video kwargs) or None if no data exists."""
+        raise NotImplementedError()
+
+    def save(self, data, updated, removed):
+        """Persist settings in data, upsert videos dicts in updated and delete filenames in removed."""
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class JSONVideosStorage(VideosStorage):
+    FULL_REWRITE = True
+    JSON_DB_PATH = settings.VIDEOS_DIR / ".videos.json"
+    JSON_DB_PATH_TMP = JSON_DB_PATH.parent / f"{JSON_DB_PATH.stem}.tmp.json"
+    DATA_FILES = (JSON_DB_PATH, JSON_DB_PATH_TMP)
+
+    def load(self):
+        if self.JSON_DB_PATH.exists():
+            with open(self.JSON_DB_PATH, "r") as file:
+                return json.load(file)
+
+    def save(self, data, updated, removed):
+        with open(self.JSON_DB_PATH_TMP, "w") as file:
+            json.dump(data, file, separators=(",", ":"))
+
+        # Atomic operation (write to temp file first)
+        os.rename(self.JSON_DB_PATH_TMP, self.JSON_DB_PATH)
+
+
+class SQLiteVideosStorage(VideosStorage):
+    SQLITE_DB_PATH = settings.VIDEOS_DIR / ".videos.sqlite3"
+    JSON_MIGRATED_PATH = JSONVideosStorage.JSON_DB_PATH.parent / f"{JSONVideosStorage.JSON_DB_PATH.name}.migrated"
+    DATA_FILES = (
+        SQLITE_DB_PATH,
+        SQLITE_DB_PATH.parent / f"{SQLITE_DB_PATH.name}-wal",
+        SQLITE_DB_PATH.parent / f"{SQLITE_DB_PATH.name}-shm",
+        SQLITE_DB_PATH.parent / f"{SQLITE_DB_PATH.name}-journal",
+        JSON_MIGRATED_PATH,
+    )
+    # Indexed columns are stored alongside the full video as a JSON blob, so new Video attributes need no migration
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS videos (
+            filename TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            is_r_rated INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS videos_title ON videos (title COLLATE NOCASE, filename);
+        CREATE INDEX IF NOT EXISTS videos_is_r_rated ON videos (is_r_rated);
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self):
+        # Access is serialized by VideosStore, but happens from both the event loop and worker threads
+        self._db = sqlite3.connect(self.SQLITE_DB_PATH, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+
+    def load(self):
+        data = {key: json.loads(value) for key, value in self._db.execute("SELECT key, value FROM settings")}
+        if not data:
+            return self.migrate_from_json()
+
+        data["videos"] = [json.loads(row) for row, in self._db.execute("SELECT data FROM videos")]
+        return data
+
+    def migrate_from_json(self):
+        json_storage = JSONVideosStorage()
+        data = json_storage.load()
+        if data is not None:
+            logger.info(f"Migrating {len(data['videos'])} videos from {json_storage.JSON_DB_PATH} to SQLite")
+            self.save(data, updated=data["videos"], removed=())
+            os.rename(json_storage.JSON_DB_PATH, self.JSON_MIGRATED_PATH)
+        return data
+
+    def save(self, data, updated, removed):
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                ((key, json.dumps(value)) for key, value in data.items() if key != "videos"),
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO videos (filename, title, is_r_rated, data) VALUES (?, ?, ?, ?)",
+                (
+                    (video["path"], video["title"], bool(video["is_r_rated"]), json.dumps(video, separators=(",", ":")))
+                    for video in updated
+                ),
+            )
+            self._db.executemany("DELETE FROM videos WHERE filename = ?", ((filename,) for filename in removed))
+
+    def close(self):
+        self._db.close()
+
+
+STORAGE_BACKENDS = {
+    "json": JSONVideosStorage,
+    "sqlite": SQLiteVideosStorage,
+}
+DATA_FILES = frozenset(path for storage_cls in STORAGE_BACKENDS.values() for path in storage_cls.DATA_FILES)
+
+
+def get_storage_backend():
+    try:
+        storage_cls = STORAGE_BACKENDS[settings.VIDEOS_STORAGE]
+    except KeyError:
+        raise Exception(f"Invalid VIDEOS_STORAGE: {settings.VIDEOS_STORAGE}. Choices: {', '.join(STORAGE_BACKENDS)}")
+    return storage_cls()
@@ -1,6 +1,7 @@
 import asyncio
-from functools import wraps
+from functools import lru_cache, wraps
 import hmac
+import json
 import logging
 import re
 import sys
@@ -10,7 +11,7 @@ import typing
 import imdb
 from uvicorn.logging import ColourizedFormatter
 
-from . import settings
+from . import metrics, settings
 
 
 AUTO_RESTART_SLEEP_TIME = 2.5
@@ -63,6 +64,7 @@ async def auto_restart_coroutine(coro: typing.Coroutine, *args, **kwargs):
 
             except Exception:
                 failure_time = time.monotonic() - start_time
+                metrics.coroutine_restarts.inc(coroutine=coro.__name__)
                 failures.append(failure_time)
                 failures = failures[-AUTO_RESTART_MIN_TRIES:]
 
@@ -92,6 +94,41 @@ def verify_password(password: str):
     )
 
 
+def verify_metrics_token(authorization: typing.Optional[str]):
+    token = str(settings.METRICS_TOKEN)
+    if not token or authorization is None:
+        return False
+    scheme, _, credentials = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(credentials.encode("utf-8"), token.encode("utf-8"))
+
+
+class CamelDict(dict):
+    """Dict whose keys (and values) are already camelCase, so convert_obj_to_camel() passes it through as is."""
+
+    pass
+
+
+class JSONFragment(str):
+    """Already encoded JSON, spliced as is into broadcast messages by encode_message()."""
+
+    pass
+
+
+def encode_json(obj):
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def encode_message(message: dict):
+    if not any(isinstance(value, JSONFragment) for value in message.values()):
+        return encode_json(message)
+    items = (
+        f"{encode_json(key)}:{value if isinstance(value, JSONFragment) else encode_json(value)}"
+        for key, value in message.items()
+    )
+    return "{" + ",".join(items) + "}"
+
+
+@lru_cache(maxsize=1024)
 def underscore_to_camel(s):
     return "".join(w.capitalize() if n > 0 else w for n, w in enumerate(s.split("_")))
 
@@ -101,7 +138,9 @@ def camel_to_underscore(s):
 
 
 def convert_obj_to_camel(obj):
-    if isinstance(obj, dict):
+    if isinstance(obj, CamelDict):
+        return obj
+    elif isinstance(obj, dict):
         return {underscore_to_camel(k): convert_obj_to_camel(v) for k, v in obj.items()}
     elif isinstance(obj, (tuple, list)):
         return list(map(convert_obj_to_camel, obj))
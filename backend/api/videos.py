@@ -1,28 +1,60 @@
 import asyncio
+import bisect
+from collections import defaultdict
 from collections.abc import MutableMapping
 from contextlib import contextmanager
 import datetime
 from functools import wraps
-import json
 import logging
 import os
 from pathlib import Path
-import random
+import posixpath
+import shutil
+import threading
+import time
 
 from watchfiles import awatch, Change as WatchFilesChange
 
-from . import settings
-from .util import SingletonBaseClass
+from . import metrics, settings
+from .probe import probe_video, ProbeError
+from .selection import RandomSelector
+from .storage import DATA_FILES, get_storage_backend
+from .util import (
+    CamelDict,
+    convert_obj_to_camel,
+    encode_json,
+    JSONFragment,
+    run_in_background,
+    SingletonBaseClass,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
+_UNSET = object()
+VIDEO_EXTENSIONS = frozenset(
+    (".avi", ".flv", ".m4v", ".mkv", ".mov", ".mp4", ".mpeg", ".mpg", ".ogv", ".ts", ".webm", ".wmv")
+)
+
+
+def path_to_filename(path):
+    # Videos are keyed by their path relative to VIDEOS_DIR, so same-named files in different folders don't collide
+    return path.relative_to(settings.VIDEOS_DIR).as_posix() if path.is_absolute() else path.as_posix()
+
+
+def is_video_filename(filename):
+    # Skip non-videos, and hidden files/folders (which includes our data files)
+    return posixpath.splitext(filename)[1].lower() in VIDEO_EXTENSIONS and not any(
+        part.startswith(".") for part in filename.split("/")
+    )
+
+
 def convert_arg_to_filename(func):
     @wraps(func)
     def wrapped(self, arg, *args, **kwargs):
         if isinstance(arg, Path):
-            arg = arg.name
+            arg = path_to_filename(arg)
         elif isinstance(arg, Video):
             arg = arg.filename
         return func(self, arg, *args, **kwargs)
@@ -31,70 +63,164 @@ def convert_arg_to_filename(func):
 
 
 class Video:
-    def __init__(self, path, title=None, duration=0, description=None, is_r_rated=False, image=None):
-        if isinstance(path, str):
-            path = settings.VIDEOS_DIR / path
-
-        if title is None:
-            title = path.stem.replace("-", " ").title()
-
-        if isinstance(duration, int):
-            duration = datetime.timedelta(seconds=duration)
-
-        self.path = path
-        self.title = title
+    # Persisted fields, in order. filename is "path" in storage and on the wire, for compatibility.
+    FIELDS = (
+        "filename",
+        "title",
+        "description",
+        "is_r_rated",
+        "duration",
+        "image",
+        "size",
+        "mtime",
+        "stream_info",
+        "probed",
+        "is_unplayable",
+        "last_played",
+    )
+    FIELD_BITS = {field: 1 << bit for bit, field in enumerate(FIELDS)}
+    ALL_FIELDS = (1 << len(FIELDS)) - 1
+    NEW = FIELD_BITS["filename"]  # Only ever set on creation
+    # Changes to these decide which random selection pools a video is in
+    SELECTION_POOL_FIELDS = NEW | FIELD_BITS["is_r_rated"] | FIELD_BITS["is_unplayable"]
+    __slots__ = FIELDS + ("dirty", "_wire_dict", "_wire_json")
+
+    def __init__(
+        self,
+        path,
+        title=None,
+        duration=0,
+        description=None,
+        is_r_rated=False,
+        image=None,
+        size=None,
+        mtime=None,
+        stream_info=None,
+        probed=None,
+        is_unplayable=False,
+        last_played=None,
+    ):
+        object.__setattr__(self, "dirty", 0)  # Bitmask of fields changed since the last catalog delta was published
+        object.__setattr__(self, "_wire_dict", None)
+        object.__setattr__(self, "_wire_json", None)
+
+        self.filename = path_to_filename(Path(path))  # Stored relative to VIDEOS_DIR
+        self.title = Path(self.filename).stem.replace("-", " ").title() if title is None else title
         self.description = description
         self.is_r_rated = is_r_rated
-        self.duration = duration
+        self.duration = duration  # In seconds
         self.image = image
+        self.size = size  # Used to detect changed files at startup
+        self.mtime = mtime
+        self.stream_info = stream_info  # Codecs and resolution
+        self.probed = probed  # [size, mtime] of file when it was last probed
+        self.is_unplayable = is_unplayable
+        self.last_played = last_played  # Unix timestamp
+
+    def __setattr__(self, name, value):
+        if (bit := self.FIELD_BITS.get(name)) is not None:
+            if name == "duration":
+                value = round(value.total_seconds() if isinstance(value, datetime.timedelta) else value)
+            if getattr(self, name, _UNSET) == value:
+                return  # Unchanged, so nothing to save, publish or invalidate
+            object.__setattr__(self, "dirty", self.dirty | bit)
+            # Any change invalidates the cached wire representations
+            object.__setattr__(self, "_wire_dict", None)
+            object.__setattr__(self, "_wire_json", None)
+        object.__setattr__(self, name, value)
 
     @property
-    def filename(self):
-        return self.path.name
-
-    def as_dict(self):
-        return {
-            **self.__dict__,
-            "path": self.filename,
-            "duration": round(self.duration.total_seconds()),
-        }
+    def path(self):
+        return settings.VIDEOS_DIR / self.filename
+
+    def update(self, **kwargs):
+        """Set attributes, and return a bitmask of the ones that actually changed."""
+        dirty = self.dirty
+        object.__setattr__(self, "dirty", 0)
+        for attr, value in kwargs.items():
+            setattr(self, attr, value)
+        changed = self.dirty
+        object.__setattr__(self, "dirty", dirty | changed)
+        return changed
+
+    @classmethod
+    def field_names(cls, mask):
+        return [field for field, bit in cls.FIELD_BITS.items() if mask & bit]
+
+    def as_dict(self, mask=ALL_FIELDS):
+        data = {"path": self.filename}
+        data.update((field, getattr(self, field)) for field in self.FIELDS[1:] if mask & self.FIELD_BITS[field])
+        return data
+
+    def as_wire_dict(self):
+        """camelCase dict for clients, cached until the video changes. Treat as read-only."""
+        if self._wire_dict is None:
+            object.__setattr__(self, "_wire_dict", CamelDict(convert_obj_to_camel(self.as_dict())))
+        return self._wire_dict
+
+    def as_wire_json(self):
+        if self._wire_json is None:
+            object.__setattr__(self, "_wire_json", encode_json(self.as_wire_dict()))
+        return self._wire_json
+
+    def needs_probe(self):
+        return self.probed != [self.size, self.mtime]
+
+    def sort_key(self):
+        return (self.title.lower(), self.filename)
 
     def __repr__(self):
         return f"{self.__class__.__name__}(filename={self.filename!r}, title={self.title!r})"
 
 
 class VideosStore(SingletonBaseClass, MutableMapping):
-    TASKS = ("watch_for_videos",)
-    JSON_DB_PATH = settings.VIDEOS_DIR / ".videos.json"
-    JSON_DB_PATH_TMP = JSON_DB_PATH.parent / f"{JSON_DB_PATH.stem}.tmp.json"
-    JSON_DATA_FILES = {JSON_DB_PATH, JSON_DB_PATH_TMP}
+    AMIXER_PATH = shutil.which("amixer")
+    TASKS = ("watch_for_videos", "probe_videos")
+    DATA_FILES = DATA_FILES
     EDITABLE_ATTRS = ("title", "description", "is_r_rated", "image")
+    SAVE_DEBOUNCE_TIME = 2.0  # Writes to SD card are coalesced into at most one per this many seconds
+    PROBE_WORKERS = 2
+    PROBE_SETTLE_TIME = 10.0  # Files modified more recently than this are probably still being copied
+    PROBE_RETRY_TIME = 300.0  # After a probe fails for reasons other than the file being unplayable
+    PROBE_PUBLISH_DELAY = 1.0  # Probe results are published in batches
 
     def __init__(self, app):
         super().__init__(app)
 
         self._in_transaction = False
+        self._dirty = False
+        self._dirty_filenames = set()  # Videos updated or removed since last flush
+        self._save_timer = None
+        self._save_lock = threading.Lock()
+        self.save_stats = {"requested": 0, "performed": 0}
+        metrics.register_stats("videos_saves", lambda: self.save_stats)
         self._videos = {}
+        self._sorted_keys = []  # Sorted list of Video.sort_key() tuples, ie channel order
+        self._directories = defaultdict(set)  # Relative directory ("" for top level) -> filenames directly inside
+        self._catalog_seq = 0  # Sequence number of last published catalog delta
+        self._probe_queue = asyncio.Queue()
+        self._probe_queued = set()
+        self._probe_results = {}
+        self._probe_publish_timer = None
+        self.selector = RandomSelector(self)
         self._play_r_rated = True
         self._muted = False
 
+        # Start on the already known catalog, library is reconciled against disk in the background by startup()
+        load_start = time.monotonic()
+        self.storage = get_storage_backend()
         self.load_data()
-
-        with self.transaction():
-            for video_path in settings.VIDEOS_DIR.iterdir():
-                self.create(video_path)
-
-            # Purge videos that don't exist
-            for video in list(self.values()):
-                if not video.path.exists():
-                    del self[video]
+        logger.info(f"Loaded {len(self)} videos in {time.monotonic() - load_start:.3f}s")
 
     async def call_amixer(self, value=None):
+        if self.AMIXER_PATH is None:
+            return  # Not on a Pi (ie, testing with the fake player backend)
+
         if value is None:
             value = "mute" if self._muted else "unmute"
 
         proc = await asyncio.create_subprocess_exec(
-            "amixer",
+            self.AMIXER_PATH,
             "set",
             settings.ALSA_DEVICE,
             value,
@@ -121,93 +247,331 @@ class VideosStore(SingletonBaseClass, MutableMapping):
     async def startup(self):
         await self.call_amixer("100%")  # Max out volume on start
         await self.call_amixer()
+        run_in_background(self.reconcile())
         await super().startup()
 
+    @staticmethod
+    def scan_videos_dir(directory=settings.VIDEOS_DIR):
+        files = {}
+        directories = [directory]
+
+        while directories:
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    # is_dir() / is_file() use the dirent's cached type, so only stat() hits the filesystem
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.is_file():
+                        filename = path_to_filename(Path(entry.path))
+                        if is_video_filename(filename):
+                            try:
+                                stat = entry.stat()
+                            except FileNotFoundError:
+                                continue  # Removed while scanning
+                            files[filename] = (stat.st_size, round(stat.st_mtime))
+        return files
+
+    @classmethod
+    def scan_paths(cls, paths):
+        """Like scan_videos_dir() for paths that can be videos or directories. Paths that are gone are skipped."""
+        files = {}
+        for path in paths:
+            try:
+                if path.is_dir():
+                    files.update(cls.scan_videos_dir(path))
+                elif path.is_file() and is_video_filename(filename := path_to_filename(path)):
+                    stat = path.stat()
+                    files[filename] = (stat.st_size, round(stat.st_mtime))
+            except FileNotFoundError:
+                pass  # Removed again before we got to it
+        return files
+
+    async def reconcile(self):
+        start_time = time.monotonic()
+        loop = asyncio.get_running_loop()
+        files = await loop.run_in_executor(None, self.scan_videos_dir)
+        scan_time = time.monotonic()
+
+        updated, removed = [], []
+        with self.transaction():
+            for filename in [filename for filename in self._videos if filename not in files]:
+                del self[filename]
+                removed.append(filename)
+
+            for filename, (size, mtime) in files.items():
+                video = self._videos.get(filename)
+                if video is None:
+                    updated.append(self.create(settings.VIDEOS_DIR / filename, size=size, mtime=mtime))
+                elif video.update(size=size, mtime=mtime):
+                    self._dirty_filenames.add(filename)
+                    updated.append(video)
+        apply_time = time.monotonic()
+
+        if updated or removed:
+            await self.publish_changes(updated=updated, removed=removed)
+        end_time = time.monotonic()
+
+        for video in self.values():
+            if video.needs_probe():
+                self.enqueue_probe(video.filename)
+
+        logger.info(
+            f"Reconciled {len(files)} files with library in {end_time - start_time:.3f}s (scan:"
+            f" {scan_time - start_time:.3f}s, apply: {apply_time - scan_time:.3f}s, publish:"
+            f" {end_time - apply_time:.3f}s). {len(updated)} new/changed, {len(removed)} removed."
+        )
+
+    def enqueue_probe(self, filename):
+        if filename not in self._probe_queued:
+            self._probe_queued.add(filename)
+            self._probe_queue.put_nowait(filename)
+
+    async def probe_videos(self):
+        await asyncio.gather(*(self._probe_worker() for _ in range(self.PROBE_WORKERS)))
+
+    async def _probe_worker(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            filename = await self._probe_queue.get()
+            self._probe_queued.discard(filename)
+            if (video := self._videos.get(filename)) is None:
+                continue
+
+            try:
+                stat = await loop.run_in_executor(None, video.path.stat)
+            except FileNotFoundError:
+                continue
+
+            if (settle_time := stat.st_mtime + self.PROBE_SETTLE_TIME - time.time()) > 0:
+                loop.call_later(settle_time, self.enqueue_probe, filename)
+                continue
+
+            key = [stat.st_size, round(stat.st_mtime)]
+            if video.probed != key:  # Results are cached by size + mtime
+                try:
+                    info, error = await probe_video(video.path, stat.st_size), None
+                except ProbeError as e:
+                    info, error = None, e
+                except Exception:
+                    # Not the file's fault (ie out of file descriptors, permissions), so nothing is cached
+                    logger.exception(f"Error probing {filename}. Retrying in {self.PROBE_RETRY_TIME:.0f}s.")
+                    loop.call_later(self.PROBE_RETRY_TIME, self.enqueue_probe, filename)
+                    continue
+                self._apply_probe_result(filename, key, info, error)
+
+    def _apply_probe_result(self, filename, key, info, error):
+        if (video := self._videos.get(filename)) is None:
+            return
+
+        changes = {"size": key[0], "mtime": key[1], "probed": key, "is_unplayable": error is not None}
+        if error is not None:
+            logger.warning(f"{filename} failed probe and appears to be unplayable: {error}")
+        elif info is not None:
+            if info["duration"] > 0:
+                changes["duration"] = info["duration"]
+            changes["stream_info"] = {key: info[key] for key in ("video_codec", "audio_codec", "width", "height")}
+            logger.info(f"Probed {filename}: {info}")
+
+        if not video.update(**changes):
+            return
+
+        self.save_data(filename)
+        self._probe_results[filename] = video
+        if self._probe_publish_timer is None:
+            self._probe_publish_timer = asyncio.get_running_loop().call_later(
+                self.PROBE_PUBLISH_DELAY, lambda: run_in_background(self._publish_probe_results())
+            )
+
+    async def _publish_probe_results(self):
+        self._probe_publish_timer = None
+        results, self._probe_results = self._probe_results, {}
+        updated = [video for filename, video in results.items() if self._videos.get(filename) is video]
+        if updated:
+            await self.publish_changes(updated=updated)
+
     async def watch_for_videos(self):
         async for changes in awatch(
             settings.VIDEOS_DIR,
             watch_filter=lambda change, _: change != WatchFilesChange.modified,
         ):
-            for change, path in changes:
-                path = Path(path)
-                if change == WatchFilesChange.added and path.is_file():
-                    self.create(path)
-                elif change == WatchFilesChange.deleted and path in self:
-                    del self[path]
-            await self.app.state.player.set_state(videos=self.as_json())
+            # Adding or removing a whole folder results in one save and one catalog delta
+            metrics.videos_watch_batch_size.observe(len(changes))
+
+            # The filesystem is only touched in a worker thread, before the library is changed
+            added = [Path(path) for change, path in changes if change == WatchFilesChange.added]
+            files = await asyncio.get_running_loop().run_in_executor(None, self.scan_paths, added) if added else {}
+
+            updated, removed = {}, set()
+            with self.transaction():
+                # Changes come as a set, so handle all deletions before additions in case a folder was replaced
+                for change, path in changes:
+                    if change == WatchFilesChange.deleted:
+                        # Could be a single video or a whole folder of them
+                        filename = path_to_filename(Path(path))
+                        for filename in [filename] if filename in self else self.filenames_in_directory(filename):
+                            del self[filename]
+                            removed.add(filename)
+
+                for filename, (size, mtime) in files.items():
+                    if (video := self.create(settings.VIDEOS_DIR / filename, size=size, mtime=mtime)) is not None:
+                        updated[video.filename] = video
+                        removed.discard(video.filename)
+
+            if updated or removed:
+                await self.publish_changes(updated=updated.values(), removed=removed)
+
+    def filenames_in_directory(self, directory):
+        prefix = f"{directory}/"
+        return [
+            filename
+            for subdirectory, filenames in self._directories.items()
+            if subdirectory == directory or subdirectory.startswith(prefix)
+            for filename in filenames
+        ]
 
     @contextmanager
     def transaction(self):
         self._in_transaction = True
-        yield
-        self._in_transaction = False
-        self.save_data()
+        try:
+            yield
+        finally:
+            self._in_transaction = False
+            if self._dirty_filenames:
+                self.save_data()
 
     def load_data(self):
-        if self.JSON_DB_PATH.exists():
-            try:
-                with open(self.JSON_DB_PATH, "r") as file:
-                    data = json.load(file)
-
+        try:
+            data = self.storage.load()
+            if data is not None:
                 videos = (Video(**kwargs) for kwargs in data["videos"])
                 self._videos = {video.filename: video for video in videos}
+                for video in self._videos.values():
+                    video.dirty = 0  # Clients get loaded videos in full, in snapshots
+                self._sorted_keys = sorted(video.sort_key() for video in self._videos.values())
+                for filename in self._videos:
+                    self._directories[posixpath.dirname(filename)].add(filename)
                 self._play_r_rated = data["play_r_rated"]
                 self._muted = data["muted"]
+        except Exception:
+            logger.exception(f"Error loading videos data from {self.storage.__class__.__name__}. Ignoring.")
+
+    def save_data(self, *filenames):
+        """Mark data (and optionally specific videos) dirty and schedule a debounced flush in a worker thread."""
+        self.save_stats["requested"] += 1
+        self._dirty = True
+        self._dirty_filenames.update(filenames)
+        if self._save_timer is None:
+            self._save_timer = asyncio.get_running_loop().call_later(
+                self.SAVE_DEBOUNCE_TIME, lambda: run_in_background(self.flush())
+            )
+
+    async def flush(self):
+        self._save_timer = None
+        if self._dirty:
+            self._dirty = False
+            data, updated, removed = self._get_data()  # Gathered on the event loop, so it's a consistent snapshot
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(None, self._write_data, data, updated, removed):
+                self.save_data(*(video["path"] for video in updated), *removed)  # Try again later
+
+    def flush_blocking(self):
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+            self._save_timer = None
+        if self._dirty:
+            self._dirty = False
+            self._write_data(*self._get_data())
+
+    def shutdown(self):
+        self.flush_blocking()
+        self.storage.close()
+
+    def _get_data(self):
+        data = {"play_r_rated": self._play_r_rated, "muted": self._muted}
+        if self.storage.FULL_REWRITE:
+            data["videos"] = self.as_json()
+
+        filenames, self._dirty_filenames = self._dirty_filenames, set()
+        updated = [self._videos[filename].as_dict() for filename in filenames if filename in self._videos]
+        removed = [filename for filename in filenames if filename not in self._videos]
+        return data, updated, removed
+
+    def _write_data(self, data, updated, removed):
+        with self._save_lock:
+            try:
+                with metrics.videos_save_seconds.time():
+                    self.storage.save(data, updated, removed)
             except Exception:
-                logger.exception("Error deserializing videos JSON file. Ignoring.")
-
-    def save_data(self):
-        data = {
-            "play_r_rated": self._play_r_rated,
-            "muted": self._muted,
-            "videos": self.as_json(),
-        }
+                logger.exception(f"Error saving videos data with {self.storage.__class__.__name__}")
+                return False
 
-        with open(self.JSON_DB_PATH_TMP, "w") as file:
-            json.dump(data, file, indent=2, sort_keys=True)
-            file.write("\n")
-
-        # Atomic operation (write to temp file first)
-        os.rename(self.JSON_DB_PATH_TMP, self.JSON_DB_PATH)
-        logger.info("Saved videos JSON")
+            self.save_stats["performed"] += 1
+            logger.info(
+                f"Saved videos data, {len(updated)} updated and {len(removed)} removed (saves requested:"
+                f" {self.save_stats['requested']}, performed: {self.save_stats['performed']})"
+            )
+            return True
 
     @convert_arg_to_filename
     def __getitem__(self, filename):
         return self._videos[filename]
 
+    def _index_add(self, video):
+        bisect.insort(self._sorted_keys, video.sort_key())
+
+    def _index_remove(self, video):
+        sort_key = video.sort_key()
+        index = bisect.bisect_left(self._sorted_keys, sort_key)
+        if index < len(self._sorted_keys) and self._sorted_keys[index] == sort_key:
+            del self._sorted_keys[index]
+        else:
+            logger.error(f"Sorted index out of sync for {video.filename}. Rebuilding.")
+            self._sorted_keys = sorted(v.sort_key() for v in self._videos.values() if v is not video)
+
     @convert_arg_to_filename
     def __setitem__(self, filename, value):
+        if (old_value := self._videos.get(filename)) is not None:
+            self._index_remove(old_value)
         self._videos[filename] = value
+        self._index_add(value)
+        self._directories[posixpath.dirname(filename)].add(filename)
+        self._dirty_filenames.add(filename)
         if not self._in_transaction:
             self.save_data()
 
     @convert_arg_to_filename
     def __delitem__(self, filename):
         logger.info(f"Removing video: {filename}")
-        del self._videos[filename]
+        self._index_remove(self._videos.pop(filename))
+        directory = posixpath.dirname(filename)
+        self._directories[directory].discard(filename)
+        if not self._directories[directory]:
+            del self._directories[directory]
+        self._dirty_filenames.add(filename)
         if not self._in_transaction:
             self.save_data()
 
     def __iter__(self):
-        return (key for key, _ in self.items())
+        return (filename for _, filename in self._sorted_keys)
 
     def items(self):
-        sorted_items = sorted(self._videos.items(), key=lambda kv: (kv[1].title.lower(), kv[0]))
-        return ((filename, video) for filename, video in sorted_items)
+        return ((filename, self._videos[filename]) for _, filename in self._sorted_keys)
 
     def values(self):
-        return (value for _, value in self.items())
+        return (self._videos[filename] for _, filename in self._sorted_keys)
 
     @convert_arg_to_filename
     def index(self, filename):
-        try:
-            return list(self.keys()).index(filename)
-        except ValueError:
+        if (video := self._videos.get(filename)) is None:
             return 0
+        return bisect.bisect_left(self._sorted_keys, video.sort_key())
 
     def filename_at_index(self, index):
-        index = index % len(self)
-        return list(self.keys())[index]
+        _, filename = self._sorted_keys[index % len(self)]
+        return filename
 
     def update(self, *args, **kwargs):
         with self.transaction():
@@ -215,17 +579,19 @@ class VideosStore(SingletonBaseClass, MutableMapping):
 
     @convert_arg_to_filename
     async def update_video(self, filename, **kwargs):
-        updated = False
         if (video := self.get(filename)) is not None:
-            for attr, value in kwargs.items():
-                if getattr(video, attr) != value:
-                    setattr(video, attr, value)
-                    logger.info(f"Set {attr}={value} for {filename}")
-                    updated = True
-
-            if updated:
-                self.save_data()
-                await self.app.state.player.set_state(videos=self.as_json())
+            # Title determines channel order, so re-position video in sorted index
+            retitled = "title" in kwargs and kwargs["title"] != video.title
+            if retitled:
+                self._index_remove(video)
+            changed = video.update(**kwargs)
+            if retitled:
+                self._index_add(video)
+
+            if changed:
+                logger.info(f"Updated {', '.join(Video.field_names(changed))} for {filename}")
+                self.save_data(filename)
+                await self.publish_changes(updated=(video,))
 
         else:
             logger.warning(f"No video {filename} to update")
@@ -233,15 +599,48 @@ class VideosStore(SingletonBaseClass, MutableMapping):
     def __len__(self):
         return len(self._videos)
 
-    def create(self, path, **kwargs):
-        if path not in self and path not in self.JSON_DATA_FILES:
-            logger.info(f"Creating video: {path.name}")
-            self[path.name] = Video(path, **kwargs)
+    def create(self, path, size, mtime, **kwargs):
+        # size and mtime come from a scan, so nothing blocks on the filesystem here
+        if path not in self and path not in self.DATA_FILES:
+            logger.info(f"Creating video: {path_to_filename(path)}")
+            video = self[path_to_filename(path)] = Video(path, size=size, mtime=mtime, **kwargs)
+            self.enqueue_probe(video.filename)
+            return video
 
     def as_json(self):
         return [v.as_dict() for v in self.values()]
 
-    def random(self):
-        choices = [v for v in self._videos.values() if self._play_r_rated or not v.is_r_rated]
-        if choices:
-            return random.choice(choices)
+    def as_snapshot(self):
+        # Assembled from each video's cached JSON, so a full snapshot is mostly a string join
+        videos = JSONFragment(f"[{','.join(v.as_wire_json() for v in self.values())}]")
+        return {"videos": videos, "videos_seq": self._catalog_seq}
+
+    async def publish_changes(self, updated=(), removed=()):
+        # Clients remove all updated + removed videos, then insert updated ones in ascending order of index
+        self._catalog_seq += 1
+        self.selector.update([video for video in updated if video.dirty & Video.SELECTION_POOL_FIELDS], removed)
+        delta = {"seq": self._catalog_seq, "updated": [], "changed": [], "removed": list(removed)}
+        for video in updated:
+            if video.dirty & Video.NEW:
+                delta["updated"].append(CamelDict(video.as_wire_dict(), index=self.index(video)))
+            elif video.dirty:
+                # Only changed fields, which clients merge into the video they already have
+                fields = convert_obj_to_camel(video.as_dict(video.dirty))
+                delta["changed"].append(CamelDict(fields, index=self.index(video)))
+            video.dirty = 0
+        logger.info(
+            f"Publishing catalog delta #{delta['seq']}: {len(delta['updated'])} new, {len(delta['changed'])} changed,"
+            f" {len(delta['removed'])} removed"
+        )
+        await self.app.state.player.broadcast({"videos_delta": delta})
+
+    def random(self, max_duration=None):
+        return self.selector.pick(play_r_rated=self._play_r_rated, max_duration=max_duration)
+
+    def is_random_eligible(self, video):
+        return self.selector.is_eligible(video, play_r_rated=self._play_r_rated)
+
+    def mark_played(self, video):
+        self.selector.record_play(video)
+        video.last_played = round(time.time())
+        self.save_data(video.filename)
@@ -0,0 +1,39 @@
+"""Microbenchmarks, run from backend/ with ie `python -m bench.selection`. They don't need a display, player or
+videos, just the backend's Python dependencies."""
+
+import os
+import tempfile
+import time
+
+
+# Settings are read when api.settings is imported, so these need to be in place before any benchmark imports api
+os.environ.setdefault("ENVFILE", os.devnull)
+os.environ.setdefault("PASSWORD_ADMIN", "bench-admin")
+os.environ.setdefault("PASSWORD_USER", "bench-user")
+os.environ.setdefault("VIDEOS_DIR_OVERRIDE", tempfile.mkdtemp(prefix="pitv-bench-videos-"))
+
+
+def timeit(func, number=1):
+    """Best of 3 runs of func called number times, in seconds per call."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, seconds):
+    print(f"{name:<60} {seconds * 1000:10.3f}ms")
+
+
+def make_videos(count):
+    """count Videos with varied titles, ordered differently by title than by filename like a real library."""
+    from api.videos import Video
+
+    return [
+        Video(f"dir-{i % 50}/video-{i:06d}.mp4", title=f"Title {(i * 7919) % count:06d}", is_r_rated=i % 10 == 0)
+        for i in range(count)
+    ]
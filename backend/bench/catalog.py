@@ -0,0 +1,46 @@
+"""Catalog startup and save cost with each VideosStore storage backend as the library grows."""
+
+import types
+
+from . import make_videos, report, timeit
+from api import settings
+from api.storage import STORAGE_BACKENDS
+from api.videos import VideosStore
+
+
+def main():
+    for count in (1000, 10000, 100000):
+        videos = make_videos(count)
+        data = {"play_r_rated": True, "muted": False, "videos": [video.as_dict() for video in videos]}
+
+        for name, storage_cls in STORAGE_BACKENDS.items():
+            for path in storage_cls.DATA_FILES:
+                path.unlink(missing_ok=True)
+            storage = storage_cls()
+            storage.save(data, data["videos"], ())
+            storage.close()
+
+            settings.VIDEOS_STORAGE = name
+            stores = []
+
+            def load():
+                stores.append(VideosStore(types.SimpleNamespace()))
+
+            report(f"{count} videos, {name}: startup (load)", timeit(load))
+            store = stores[-1]
+            assert len(store) == count
+            filename = videos[count // 2].filename
+
+            def save(filenames):
+                store._dirty = True
+                store._dirty_filenames.update(filenames)
+                store.flush_blocking()
+
+            report(f"{count} videos, {name}: save 1 changed video", timeit(lambda: save([filename])))
+            report(f"{count} videos, {name}: save every video", timeit(lambda: save(store.keys())))
+            for loaded in stores:
+                loaded.storage.close()
+
+
+if __name__ == "__main__":
+    main()
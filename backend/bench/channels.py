@@ -0,0 +1,43 @@
+"""Channel up/down (Player.change_channel) as the library grows: the maintained sorted index against sorting the
+whole library on each access, which is what VideosStore used to do."""
+
+import types
+
+from . import make_videos, report, timeit
+from api.storage import JSONVideosStorage
+from api.videos import VideosStore
+
+
+def sorted_filenames(videos):
+    return [filename for filename, _ in sorted(videos.items(), key=lambda kv: (kv[1].title.lower(), kv[0]))]
+
+
+def resorted_channel_change(videos, filename, direction=1):
+    # index() and filename_at_index() each sorted everything
+    filenames = sorted_filenames(videos)
+    index = filenames.index(filename) if filename in filenames else 0
+    return sorted_filenames(videos)[(index + direction) % len(videos)]
+
+
+def main():
+    storage = JSONVideosStorage()
+    for count in (1000, 10000, 100000):
+        videos = make_videos(count)
+        storage.save({"play_r_rated": True, "muted": False, "videos": [video.as_dict() for video in videos]}, (), ())
+        store = VideosStore(types.SimpleNamespace())
+        filename = videos[count // 2].filename
+
+        def change_channel():
+            store.filename_at_index(store.index(filename) + 1)
+
+        assert store.filename_at_index(store.index(filename) + 1) == resorted_channel_change(store._videos, filename)
+        report(f"{count} videos: change channel (sorted index)", timeit(change_channel, number=1000))
+        report(
+            f"{count} videos: change channel (re-sorting)",
+            timeit(lambda: resorted_channel_change(store._videos, filename)),
+        )
+        report(f"{count} videos: iterate in channel order", timeit(lambda: list(store.values())))
+
+
+if __name__ == "__main__":
+    main()
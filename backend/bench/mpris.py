@@ -0,0 +1,127 @@
+"""Latency of omxplayer backend status queries and commands against a mock MPRIS player, on a private dbus-daemon
+started just for the benchmark. Compares GetAll, concurrent property Gets and Gets awaited one after another (what
+the backend used to do)."""
+
+import asyncio
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from dbus_next.aio import MessageBus
+from dbus_next.service import dbus_property, method, PropertyAccess, ServiceInterface
+
+from . import report
+from api.player_backends.omxplayer import OMXPlayerBackend
+
+
+NUMBER = 2000
+
+
+class MockPlayer(ServiceInterface):
+    def __init__(self):
+        super().__init__(OMXPlayerBackend.DBUS_PLAYER_INTERFACE)
+        self.position = 0
+        self.paused = False
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Position(self) -> "x":  # noqa: F821
+        return self.position
+
+    @dbus_property(access=PropertyAccess.READ)
+    def Duration(self) -> "x":  # noqa: F821
+        return 3600 * 1000000
+
+    @dbus_property(access=PropertyAccess.READ)
+    def PlaybackStatus(self) -> "s":  # noqa: F821
+        return "Paused" if self.paused else "Playing"
+
+    @method()
+    def Seek(self, offset: "x") -> "x":  # noqa: F821
+        self.position = max(self.position + offset, 0)
+        return self.position
+
+    @method()
+    def SetPosition(self, track: "o", position: "x") -> "x":  # noqa: F821
+        self.position = position
+        return self.position
+
+    @method()
+    def PlayPause(self) -> "s":  # noqa: F821
+        self.paused = not self.paused
+        return self.PlaybackStatus
+
+
+def serve_mock_player(address, ready):
+    # Own thread and event loop, so the backend's calls really wait on replies like they would from omxplayer
+    async def serve():
+        bus = await MessageBus(address).connect()
+        bus.export("/org/mpris/MediaPlayer2", MockPlayer())
+        await bus.request_name(OMXPlayerBackend.DBUS_DESTINATION)
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+async def atimeit(func, number=NUMBER):
+    """Best of 3 runs of awaiting func() number times, in seconds per call."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(number):
+            await func()
+        elapsed = (time.perf_counter() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+async def run(address_path):
+    backend = OMXPlayerBackend(on_status_push=lambda **kwargs: None)
+    backend.DBUS_BUS_ADDRESS_PATH = address_path
+    await backend.get_dbus_message_bus()
+
+    async def sequential_gets():
+        for member in ("Position", "PlaybackStatus", "Duration"):
+            await backend._dbus_helper("Get", "ss", [backend.DBUS_PLAYER_INTERFACE, member])
+
+    async def seek_then_status():
+        await backend._dbus_helper("Seek", "x", [0])
+        await backend.get_status(with_duration=False)
+
+    assert (await backend.get_status()).duration == 3600
+    report("status: GetAll", await atimeit(backend.get_status))
+    report("seek + status: pipelined", await atimeit(lambda: backend.seek(0)))
+    report("seek + status: one after another", await atimeit(seek_then_status))
+
+    backend._dbus_get_all_supported = False
+    assert (await backend.get_status()).duration == 3600
+    report("status: concurrent Gets", await atimeit(backend.get_status))
+    report("status: Gets one after another", await atimeit(sequential_gets))
+
+
+def main():
+    daemon = subprocess.Popen(
+        ["dbus-daemon", "--session", "--nofork", "--print-address"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    try:
+        address = daemon.stdout.readline().strip()
+        ready = threading.Event()
+        threading.Thread(target=serve_mock_player, args=(address, ready), daemon=True).start()
+        ready.wait()
+
+        with tempfile.TemporaryDirectory() as directory:
+            address_path = Path(directory) / "bus-address"
+            address_path.write_text(address)
+            asyncio.run(run(address_path))
+    finally:
+        daemon.terminate()
+        daemon.wait()
+
+
+if __name__ == "__main__":
+    main()
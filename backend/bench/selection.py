@@ -0,0 +1,44 @@
+import itertools
+import random
+
+from . import report, timeit
+from api.selection import RandomSelector
+from api.videos import Video
+
+
+def main():
+    random.seed(0)
+    for count in (1000, 10000, 100000):
+        videos = {}
+        for i in range(count):
+            video = Video(f"video-{i:06d}.mp4", last_played=None if i % 4 else 1, is_r_rated=i % 10 == 0)
+            videos[video.filename] = video
+        selector = RandomSelector(videos)
+
+        def build():
+            selector.invalidate()
+            selector.get_pool(True)
+
+        report(f"{count} videos: build pool", timeit(build))
+        selector.get_pool(True)
+        report(f"{count} videos: pick (pool already built)", timeit(selector.pick, number=10000))
+
+        def pick_and_play():
+            selector.record_play(selector.pick())
+
+        report(f"{count} videos: pick + record_play", timeit(pick_and_play, number=10000))
+
+        added = itertools.count()
+
+        def add_and_pick():
+            # Like a watch batch of one new video, including the occasional rebuild once enough have been added
+            video = Video(f"added-{next(added):06d}.mp4")
+            videos[video.filename] = video
+            selector.update([video])
+            selector.pick()
+
+        report(f"{count} videos: add video + pick (amortized)", timeit(add_and_pick, number=10000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Encoding the full catalog snapshot sent to clients: from each video's cached JSON, against converting every
+video's keys to camelCase and encoding them all again, which is what the backend used to do."""
+
+import json
+import types
+
+from . import make_videos, report, timeit
+from api.storage import JSONVideosStorage
+from api.util import convert_obj_to_camel, encode_json, encode_message
+from api.videos import VideosStore
+
+
+def uncached_underscore_to_camel(s):
+    return "".join(w.capitalize() if n > 0 else w for n, w in enumerate(s.split("_")))
+
+
+def uncached_convert_obj_to_camel(obj):
+    if isinstance(obj, dict):
+        return {uncached_underscore_to_camel(k): uncached_convert_obj_to_camel(v) for k, v in obj.items()}
+    elif isinstance(obj, (tuple, list)):
+        return list(map(uncached_convert_obj_to_camel, obj))
+    else:
+        return obj
+
+
+def main():
+    count = 10000
+    videos = make_videos(count)
+    JSONVideosStorage().save({"play_r_rated": True, "muted": False, "videos": [v.as_dict() for v in videos]}, (), ())
+    store = VideosStore(types.SimpleNamespace())
+
+    def uncached():
+        return encode_json(uncached_convert_obj_to_camel({"videos": store.as_json(), "videos_seq": 0}))
+
+    def cached():
+        return encode_message(convert_obj_to_camel(store.as_snapshot()))
+
+    def cold():
+        for video in store.values():
+            object.__setattr__(video, "_wire_dict", None)
+            object.__setattr__(video, "_wire_json", None)
+        return cached()
+
+    assert json.loads(cached()) == json.loads(uncached())
+    report(f"{count} videos: snapshot, converting and encoding everything", timeit(uncached))
+    report(f"{count} videos: snapshot, per-video caches empty", timeit(cold))
+    report(f"{count} videos: snapshot, per-video caches filled", timeit(cached))
+
+
+if __name__ == "__main__":
+    main()
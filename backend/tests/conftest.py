@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+
+# Settings are read when api.settings is imported, so these need to be in place before any test imports api
+os.environ.setdefault("ENVFILE", os.devnull)
+os.environ.setdefault("PASSWORD_ADMIN", "test-admin")
+os.environ.setdefault("PASSWORD_USER", "test-user")
+os.environ.setdefault("VIDEOS_DIR_OVERRIDE", tempfile.mkdtemp(prefix="pitv-test-videos-"))
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from api.broadcast import Broadcaster
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+def fill_queue(messages):
+    """Broadcast messages to one client (before its sender task gets to run), returning its queue and websocket."""
+
+    async def run():
+        broadcaster = Broadcaster()
+        broadcaster.MAX_QUEUE_SIZE = 4
+        websocket = RecordingWebSocket()
+        broadcaster.add(websocket)
+        client = broadcaster.clients[websocket]
+        for message, is_state, *is_snapshot in messages:
+            broadcaster.broadcast(message, is_state=is_state, is_snapshot=any(is_snapshot))
+        queued = [json.loads(message.text) for message in client.queue]
+
+        while len(websocket.sent) < len(queued):  # Let the sender task drain the queue
+            await asyncio.sleep(0)
+        broadcaster.remove(websocket)
+        return queued, websocket.sent, broadcaster.stats
+
+    return asyncio.run(run())
+
+
+def test_only_state_message_is_never_dropped():
+    queued, sent, stats = fill_queue(
+        [
+            ({"muted": True}, True),
+            *(({"notify": {"type": "keyPress", "n": n}}, False) for n in range(6)),
+        ]
+    )
+    assert queued[0] == {"muted": True}
+    assert [message["notify"]["n"] for message in queued[1:]] == [3, 4, 5]
+    assert stats["dropped"] == 3
+    assert sent == queued
+
+
+def test_coalesced_state_keeps_oldest_position():
+    queued, sent, stats = fill_queue(
+        [
+            ({"currentlyPlaying": "a.mp4"}, True),
+            ({"notify": {"type": "newVideo"}}, False),
+            ({"muted": True}, True),
+            ({"currentlyPlaying": "b.mp4"}, True),
+            ({"notify": {"type": "keyPress"}}, False),
+        ]
+    )
+    assert queued == [
+        {"currentlyPlaying": "b.mp4", "muted": True},
+        {"notify": {"type": "newVideo"}},
+        {"notify": {"type": "keyPress"}},
+    ]
+    assert stats["coalesced"] == 2 and stats["dropped"] == 0
+    assert sent == queued
+
+
+def test_catalog_snapshot_is_never_dropped():
+    # The reply to authorize, with deltas for the snapshot arriving while the client is backed up
+    snapshot = {"title": "TV", "muted": False, "videos": [], "videosSeq": 1}
+    queued, sent, stats = fill_queue(
+        [
+            (snapshot, False, True),
+            *(({"videosDelta": {"seq": seq}}, False) for seq in range(2, 8)),
+        ]
+    )
+    assert queued[0] == snapshot
+    assert [message["videosDelta"]["seq"] for message in queued[1:]] == [5, 6, 7]
+    assert stats["dropped"] == 3
+    assert sent == queued
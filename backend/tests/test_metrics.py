@@ -0,0 +1,32 @@
+from starlette.datastructures import Secret
+from starlette.requests import Request
+
+from api import metrics, settings
+from api.app import metrics_endpoint
+
+
+def make_request(headers=(), client=("172.18.0.1", 12345)):
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/metrics",
+            "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+            "client": client,
+        }
+    )
+
+
+def test_metrics_endpoint_requires_token(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", Secret("s3cret"))
+    allowed = metrics_endpoint(make_request([("Authorization", "Bearer s3cret")]))
+    assert allowed.status_code == 200
+    assert allowed.body.decode() == metrics.render()
+
+    for headers in ([], [("Authorization", "Bearer wrong")], [("X-Forwarded-For", "127.0.0.1")]):
+        assert metrics_endpoint(make_request(headers, client=("127.0.0.1", 1))).status_code == 307
+
+
+def test_metrics_endpoint_disabled_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", Secret(""))
+    assert metrics_endpoint(make_request([("Authorization", "Bearer ")])).status_code == 307
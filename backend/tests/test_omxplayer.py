@@ -0,0 +1,40 @@
+import asyncio
+import types
+
+from dbus_next import MessageType
+
+from api.player_backends.omxplayer import OMXPlayerBackend
+
+
+PROPERTIES = {"Position": 5000000, "PlaybackStatus": "Playing", "Duration": 60000000}
+
+
+def make_backend(get_all_error):
+    backend = OMXPlayerBackend(on_status_push=lambda **kwargs: None)
+    calls = []
+
+    async def dbus_helper(member, signature="", body=None):
+        calls.append(member)
+        if member == "GetAll":
+            return types.SimpleNamespace(message_type=MessageType.ERROR, error_name=get_all_error, body=[])
+        value = PROPERTIES[body[1]]
+        return types.SimpleNamespace(message_type=MessageType.METHOD_RETURN, error_name=None, body=[value])
+
+    backend._dbus_helper = dbus_helper
+    return backend, calls
+
+
+def test_get_all_falls_back_to_gets_when_unsupported():
+    for error in OMXPlayerBackend.DBUS_UNSUPPORTED_ERRORS:
+        backend, calls = make_backend(error)
+        assert asyncio.run(backend.get_status()) == (5, 60, False)
+        assert not backend._dbus_get_all_supported
+        assert calls == ["GetAll", "Get", "Get", "Get"]
+
+
+def test_get_all_kept_after_transient_errors():
+    for error in (OMXPlayerBackend.DBUS_SERVICE_UNKNOWN_ERROR, "org.freedesktop.DBus.Error.NoReply"):
+        backend, calls = make_backend(error)
+        assert asyncio.run(backend.get_status()) is None
+        assert backend._dbus_get_all_supported
+        assert calls == ["GetAll"]
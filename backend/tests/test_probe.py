@@ -0,0 +1,116 @@
+import asyncio
+import struct
+
+import pytest
+
+from api import probe
+from api.probe import probe_headers_blocking, probe_video, ProbeError
+
+
+def box(box_type, *children):
+    payload = b"".join(children)
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def mp4_track(handler_type, codec, width=0, height=0):
+    # tkhd version 0: width and height are 16.16 fixed point, 76 bytes in
+    tkhd = box(b"tkhd", bytes(76), struct.pack(">II", width << 16, height << 16))
+    hdlr = box(b"hdlr", bytes(8), handler_type, bytes(12), b"handler\x00")
+    stsd = box(b"stsd", bytes(4), struct.pack(">I", 1), struct.pack(">I4s", 16, codec), bytes(8))
+    return box(b"trak", tkhd, box(b"mdia", hdlr, box(b"minf", box(b"stbl", stsd))))
+
+
+def make_mp4(*tracks, timescale=1000, duration=90500):
+    mvhd = box(b"mvhd", bytes(12), struct.pack(">II", timescale, duration), bytes(80))
+    return box(b"ftyp", b"isom", bytes(4), b"isomavc1") + box(b"moov", mvhd, *tracks) + box(b"mdat", bytes(64))
+
+
+MP4 = make_mp4(mp4_track(b"vide", b"avc1", 1920, 1080), mp4_track(b"soun", b"mp4a"))
+
+
+def ebml(element_id, *children):
+    payload = b"".join(children)
+    # 8 byte size: 0x01 marker followed by 7 bytes of length
+    size = ((1 << 56) | len(payload)).to_bytes(8, "big")
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big") + size + payload
+
+
+def ebml_uint(element_id, value):
+    return ebml(element_id, value.to_bytes(4, "big"))
+
+
+def make_mkv(duration_ms=90500.0, float_size=8):
+    info = ebml(
+        probe.MKV_INFO,
+        ebml_uint(probe.MKV_TIMECODE_SCALE, 1000000),
+        ebml(probe.MKV_DURATION, struct.pack(">d" if float_size == 8 else ">f", duration_ms)),
+    )
+    video_track = ebml(
+        probe.MKV_TRACK_ENTRY,
+        ebml_uint(probe.MKV_TRACK_TYPE, 1),
+        ebml(probe.MKV_CODEC_ID, b"V_MPEG4/ISO/AVC"),
+        ebml(probe.MKV_VIDEO, ebml_uint(probe.MKV_PIXEL_WIDTH, 1280), ebml_uint(probe.MKV_PIXEL_HEIGHT, 720)),
+    )
+    audio_track = ebml(
+        probe.MKV_TRACK_ENTRY, ebml_uint(probe.MKV_TRACK_TYPE, 2), ebml(probe.MKV_CODEC_ID, b"A_AAC\x00")
+    )
+    cluster = ebml(probe.MKV_CLUSTER, bytes(32))
+    header = ebml(int.from_bytes(probe.MKV_EBML_MAGIC, "big"), ebml(0x4282, b"matroska"))
+    return header + ebml(probe.MKV_SEGMENT, info, ebml(probe.MKV_TRACKS, video_track, audio_track), cluster)
+
+
+MKV = make_mkv()
+
+
+def probe_bytes(tmp_path, data):
+    path = tmp_path / "video"
+    path.write_bytes(data)
+    return probe_headers_blocking(path, len(data))
+
+
+def test_mp4(tmp_path):
+    info = {"duration": 90.5, "video_codec": "avc1", "audio_codec": "mp4a", "width": 1920, "height": 1080}
+    assert probe_bytes(tmp_path, MP4) == info
+
+
+def test_mkv(tmp_path):
+    info = {"duration": 90.5, "video_codec": "V_MPEG4/ISO/AVC", "audio_codec": "A_AAC", "width": 1280, "height": 720}
+    assert probe_bytes(tmp_path, MKV) == info
+    assert probe_bytes(tmp_path, make_mkv(float_size=4)) == info
+
+
+def test_unsupported_container(tmp_path):
+    assert probe_bytes(tmp_path, b"RIFF\x00\x00\x00\x00AVI LIST") is None
+
+
+@pytest.mark.parametrize(
+    "data", [MP4[:60], MP4[:-200], MKV[:50], MKV[:120]], ids=["mp4", "mp4-moov", "mkv", "mkv-info"]
+)
+def test_truncated(tmp_path, data):
+    with pytest.raises(ProbeError):
+        probe_bytes(tmp_path, data)
+
+
+def test_corrupt(tmp_path):
+    moov = MP4.index(b"moov") - 4
+    with pytest.raises(ProbeError):
+        probe_bytes(tmp_path, MP4[:moov] + struct.pack(">I", 4) + MP4[moov + 4 :])  # Box smaller than its header
+    with pytest.raises(ProbeError):
+        probe_bytes(tmp_path, make_mp4()[: MP4.index(b"moov") - 4] + box(b"free"))  # No moov
+    segment = MKV.index(probe.MKV_SEGMENT.to_bytes(4, "big"))
+    with pytest.raises(ProbeError):
+        probe_bytes(tmp_path, MKV[: segment + 4] + b"\x00" + MKV[segment + 5 :])  # Size with no length marker
+
+
+def test_no_video_stream_is_unplayable(tmp_path, monkeypatch):
+    monkeypatch.setattr(probe, "FFPROBE_PATH", None)
+    path = tmp_path / "audio.mp4"
+    path.write_bytes(make_mp4(mp4_track(b"soun", b"mp4a")))
+    with pytest.raises(ProbeError):
+        asyncio.run(probe_video(path, path.stat().st_size))
+
+
+def test_ffprobe_duration_not_available():
+    assert probe._parse_ffprobe_duration("N/A") == 0
+    assert probe._parse_ffprobe_duration(None) == 0
+    assert probe._parse_ffprobe_duration("90.500000") == 90.5
@@ -0,0 +1,176 @@
+from collections import Counter
+import random
+import time
+
+from api import settings
+from api.player import Player
+from api.selection import RandomSelector
+from api.videos import Video
+
+
+PICKS = 60000
+LONG_AGO = int(time.time()) - 2 * RandomSelector.RECENCY_PENALTY_TIME  # Watched, but not recently enough to penalize
+
+
+def make_videos(count, never_watched=0, r_rated=0):
+    videos = {}
+    for i in range(count):
+        video = Video(
+            f"video-{i:03d}.mp4",
+            is_r_rated=i < r_rated,
+            last_played=None if i >= count - never_watched else LONG_AGO,
+        )
+        videos[video.filename] = video
+    return videos
+
+
+def assert_distribution(counts, expected, picks=PICKS):
+    for filename, probability in expected.items():
+        # Within 5 standard deviations of a binomial, so this practically never fails by chance
+        stddev = (picks * probability * (1 - probability)) ** 0.5
+        assert abs(counts[filename] - picks * probability) < 5 * stddev, filename
+
+
+def test_pick_distribution_matches_weights():
+    random.seed(1234)
+    videos = make_videos(20, never_watched=5)
+    selector = RandomSelector(videos)
+    counts = Counter(selector.pick().filename for _ in range(PICKS))
+
+    total = 5 * RandomSelector.NEVER_WATCHED_BOOST + 15
+    assert_distribution(
+        counts,
+        {
+            filename: (RandomSelector.NEVER_WATCHED_BOOST if video.last_played is None else 1.0) / total
+            for filename, video in videos.items()
+        },
+    )
+
+
+def test_watching_adjusts_weight_without_rebuilding_pool():
+    random.seed(5678)
+    videos = make_videos(20, never_watched=5)
+    selector = RandomSelector(videos)
+    pool = selector.get_pool(True)
+
+    watched = videos["video-019.mp4"]
+    watched.last_played = LONG_AGO
+    selector.record_play(watched)
+    selector._recent.clear()  # Only testing weights here
+
+    counts = Counter(selector.pick().filename for _ in range(PICKS))
+    assert selector.get_pool(True) is pool
+    total = 4 * RandomSelector.NEVER_WATCHED_BOOST + 16
+    assert_distribution(
+        counts,
+        {
+            filename: (RandomSelector.NEVER_WATCHED_BOOST if video.last_played is None else 1.0) / total
+            for filename, video in videos.items()
+        },
+    )
+
+
+def test_no_repeat_window_and_r_rated_pool():
+    random.seed(42)
+    videos = make_videos(30, r_rated=10)
+    selector = RandomSelector(videos)
+
+    played = []
+    for _ in range(200):
+        video = selector.pick(play_r_rated=False)
+        assert not video.is_r_rated
+        assert video.filename not in played[-RandomSelector.NO_REPEAT_WINDOW :]
+        selector.record_play(video)
+        played.append(video.filename)
+
+
+def test_removed_videos_are_not_picked():
+    random.seed(7)
+    videos = make_videos(10)
+    selector = RandomSelector(videos)
+    selector.get_pool(True)
+    del videos["video-000.mp4"]
+    assert all(selector.pick().filename != "video-000.mp4" for _ in range(1000))
+
+
+def test_picked_ahead_video_is_ineligible_once_played():
+    videos = make_videos(30, r_rated=10)
+    selector = RandomSelector(videos)
+    video = videos["video-020.mp4"]
+    assert selector.is_eligible(video) and selector.is_eligible(video, play_r_rated=False)
+
+    selector.record_play(video)  # ie requested explicitly while it was waiting to be played as the random pick
+    assert not selector.is_eligible(video)
+    assert not selector.is_eligible(videos["video-000.mp4"], play_r_rated=False)
+
+
+def test_duration_budget_favors_videos_that_fit():
+    random.seed(99)
+    videos = make_videos(10)
+    for i, video in enumerate(videos.values()):
+        video.duration = 600 if i < 5 else 3000
+    videos["video-009.mp4"].duration = 0  # Not probed yet, so assumed to fit
+    selector = RandomSelector(videos)
+    counts = Counter(selector.pick(max_duration=1200).filename for _ in range(PICKS))
+
+    weights = {
+        filename: 1.0 if video.duration <= 1200 else RandomSelector.OVERRUN_WEIGHT for filename, video in videos.items()
+    }
+    total = sum(weights.values())
+    assert_distribution(counts, {filename: weight / total for filename, weight in weights.items()})
+
+
+def test_pools_updated_in_place():
+    random.seed(2468)
+    videos = make_videos(20, r_rated=5)
+    selector = RandomSelector(videos)
+    pools = selector.get_pool(True), selector.get_pool(False)
+
+    added = videos["video-new.mp4"] = Video("video-new.mp4")  # Never watched
+    rated = videos["video-010.mp4"]
+    rated.is_r_rated = True
+    unrated = videos["video-000.mp4"]
+    unrated.is_r_rated = False
+    del videos["video-019.mp4"]
+    selector.update([added, rated, unrated], removed=["video-019.mp4"])
+
+    # Changed back and forth, which mustn't enter it twice
+    rated.is_r_rated = False
+    selector.update([rated])
+    rated.is_r_rated = True
+    selector.update([rated])
+
+    assert (selector.get_pool(True), selector.get_pool(False)) == pools
+    for play_r_rated in (True, False):
+        counts = Counter(selector.pick(play_r_rated).filename for _ in range(PICKS))
+        weights = {
+            filename: RandomSelector.NEVER_WATCHED_BOOST if video.last_played is None else 1.0
+            for filename, video in videos.items()
+            if play_r_rated or not video.is_r_rated
+        }
+        total = sum(weights.values())
+        assert_distribution(counts, {filename: weight / total for filename, weight in weights.items()})
+        assert set(counts) == set(weights)
+
+
+def test_pool_rebuilt_once_many_videos_change():
+    videos = make_videos(100)
+    selector = RandomSelector(videos)
+    pool = selector.get_pool(True)
+    for i in range(30):
+        video = videos[f"video-{i:03d}.mp4"]
+        video.is_unplayable = True
+        selector.update([video])
+    assert selector.get_pool(True) is not pool
+    assert len(selector.get_pool(True)) == 70
+
+
+def test_fill_time_left_until_end_of_block(monkeypatch):
+    monkeypatch.setattr(settings, "RANDOM_FILL_BLOCK_MINUTES", 0)
+    assert Player.get_fill_time_left() is None
+
+    monkeypatch.setattr(settings, "RANDOM_FILL_BLOCK_MINUTES", 30)
+    ten_past = time.mktime((2024, 5, 1, 20, 10, 0, 0, 0, -1)) + 0.5
+    monkeypatch.setattr(time, "time", lambda: ten_past)
+    assert Player.get_fill_time_left() == 20 * 60 - 0.5
+    assert Player.get_fill_time_left(starting_in=25 * 60) == 25 * 60 - 0.5  # Starts at 20:35
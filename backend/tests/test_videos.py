@@ -0,0 +1,94 @@
+import asyncio
+import errno
+import os
+import time
+import types
+
+from watchfiles import Change
+
+from api import settings, videos
+from api.probe import ProbeError
+from api.videos import Video, VideosStore
+
+
+def test_watch_scans_outside_transaction_and_skips_vanished_files(monkeypatch):
+    root = settings.VIDEOS_DIR / "watch"
+    (root / "new" / "sub").mkdir(parents=True)
+    (root / "new" / "a.mp4").write_bytes(b"a")
+    (root / "new" / "sub" / "b.mkv").write_bytes(b"bb")
+    (root / "new" / "notes.txt").write_text("not a video")
+    changes = {
+        (Change.added, str(root / "new")),
+        (Change.added, str(root / "vanished.mp4")),  # Deleted again before the batch was handled
+        (Change.deleted, str(root / "old.mp4")),
+    }
+
+    async def awatch(*args, **kwargs):
+        yield changes
+
+    async def run():
+        deltas = []
+
+        async def broadcast(message):
+            deltas.append(message["videos_delta"])
+
+        store = VideosStore(types.SimpleNamespace(state=types.SimpleNamespace(player=types.SimpleNamespace())))
+        store.app.state.player.broadcast = broadcast
+        store["watch/old.mp4"] = Video("watch/old.mp4")
+
+        scanned_in_transaction = []
+        scan_paths = store.scan_paths
+
+        def checked_scan_paths(paths):
+            scanned_in_transaction.append(store._in_transaction)
+            return scan_paths(paths)
+
+        monkeypatch.setattr(store, "scan_paths", checked_scan_paths)
+        monkeypatch.setattr(videos, "awatch", awatch)
+        await store.watch_for_videos()
+        return store, deltas, scanned_in_transaction
+
+    store, deltas, scanned_in_transaction = asyncio.run(run())
+    assert scanned_in_transaction == [False]
+    assert sorted(store.keys()) == ["watch/new/a.mp4", "watch/new/sub/b.mkv"]
+    assert store["watch/new/sub/b.mkv"].size == 2
+    assert len(deltas) == 1
+    assert sorted(video["path"] for video in deltas[0]["updated"]) == ["watch/new/a.mp4", "watch/new/sub/b.mkv"]
+    assert deltas[0]["removed"] == ["watch/old.mp4"]
+
+
+def probe_with(monkeypatch, errors):
+    """Runs the probe worker on a settled video file, with probes raising errors in turn. Returns the video."""
+    path = settings.VIDEOS_DIR / "probe" / f"{len(errors)}.mp4"
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b"video")
+    os.utime(path, (time.time() - 3600, time.time() - 3600))
+    probes = []
+
+    async def probe_video(path, file_size):
+        probes.append(path)
+        raise errors[len(probes) - 1]
+
+    async def run():
+        store = VideosStore(types.SimpleNamespace())
+        monkeypatch.setattr(store, "PROBE_RETRY_TIME", 0.01)
+        store._in_transaction = True  # Nothing to save
+        video = store.create(path, size=5, mtime=0)
+        worker = asyncio.create_task(store._probe_worker())
+        while len(probes) < len(errors) or store._probe_queued:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        worker.cancel()
+        return video
+
+    monkeypatch.setattr(videos, "probe_video", probe_video)
+    return asyncio.run(asyncio.wait_for(run(), 5))
+
+
+def test_only_probe_errors_mark_videos_unplayable(monkeypatch):
+    video = probe_with(monkeypatch, [ProbeError("No video stream found")])
+    assert video.is_unplayable and video.probed == [5, video.mtime]
+
+    # Transient errors leave it unprobed, and it's retried until a probe gets through
+    video = probe_with(monkeypatch, [OSError(errno.EMFILE, "Too many open files"), PermissionError(), ValueError()])
+    assert not video.is_unplayable and video.probed is None
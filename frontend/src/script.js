@@ -16,6 +16,11 @@ document.addEventListener('alpine:init', () => {
     socket.send(JSON.stringify(data))
   }
 
+  // Backend only pushes progress frequently while someone is looking at it
+  function sendWatchProgress () {
+    sendJSON({ watchProgress: document.visibilityState === 'visible' })
+  }
+
   Alpine.store('alert', {
     alerts: [],
     id: 0,
@@ -49,6 +54,7 @@ document.addEventListener('alpine:init', () => {
     },
     /* Copied from backend/api/player.py:Player._state */
     videos: null,
+    videosSeq: 0,
     currentlyPlaying: null,
     download: null,
     position: null,
@@ -85,6 +91,32 @@ document.addEventListener('alpine:init', () => {
       return null
     },
 
+    applyVideosDelta (delta) {
+      if (delta.seq <= this.videosSeq) {
+        return // Stale delta, already included in a snapshot
+      } else if (delta.seq !== this.videosSeq + 1) {
+        if (DATA.DEBUG) {
+          console.log(`Missed catalog delta (have #${this.videosSeq}, got #${delta.seq}). Requesting resync.`)
+        }
+        sendJSON({ videosResync: true })
+        return
+      }
+
+      // Changed videos only come with the fields that changed, so merge those into the videos we have
+      const videos = this.videos || []
+      const byPath = new Map(videos.map(video => [video.path, video]))
+      const updated = delta.updated.concat(delta.changed.map(fields => ({ ...byPath.get(fields.path), ...fields })))
+
+      // Remove all updated + removed videos, then insert updated ones in ascending order of index
+      const affected = new Set(delta.removed.concat(updated.map(video => video.path)))
+      const remaining = videos.filter(video => !affected.has(video.path))
+      for (const { index, ...video } of updated.sort((a, b) => a.index - b.index)) {
+        remaining.splice(index, 0, video)
+      }
+      this.videos = remaining
+      this.videosSeq = delta.seq
+    },
+
     formatDuration (s, forceHour = false) {
       let d = ''
       if (s > 3600 || forceHour) {
@@ -196,6 +228,12 @@ document.addEventListener('alpine:init', () => {
         }
       }
 
+      document.addEventListener('visibilitychange', () => {
+        if (this.authorized) {
+          sendWatchProgress()
+        }
+      })
+
       socket.onclose = socket.onerror = () => {
         if (this.hasSocketOpenedBefore) {
           this.interstitialDescription = 'Reconnecting'
@@ -220,6 +258,8 @@ document.addEventListener('alpine:init', () => {
               if (value.type === 'alert') {
                 this.alert.show(value.message, value.level || undefined, value.timeout || undefined)
               }
+            } else if (key === 'videosDelta') {
+              this.player.applyVideosDelta(value)
             } else {
               this.player[key] = value
             }
@@ -231,6 +271,7 @@ document.addEventListener('alpine:init', () => {
             this.isAdmin = message === 'PASSWORD_ACCEPTED_ADMIN'
             this.interstitialDescription = 'Initializing'
             this.interstitialAlertClass = 'alert-success'
+            sendWatchProgress()
           } else { // PASSWORD_DENIED
             this.badPassword = this.enterPassword = true
             this.persist.password = ''
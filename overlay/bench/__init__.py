@@ -0,0 +1,32 @@
+"""Microbenchmarks, run from overlay/ with ie `python -m bench.render`. They draw on plain pygame surfaces, so they
+don't need a Pi or a display."""
+
+import contextlib
+import io
+import sys
+import time
+import types
+
+
+try:
+    with contextlib.redirect_stdout(io.StringIO()):
+        import dispmanx  # noqa: F401
+except (ImportError, SystemExit):
+    # Only loads on a Pi (exits without libbcm_host), and isn't used without a display
+    sys.modules["dispmanx"] = types.SimpleNamespace(DispmanX=None)
+
+
+def timeit(func, number=1, timer=time.perf_counter):
+    """Best of 3 runs of func called number times, in seconds per call."""
+    best = None
+    for _ in range(3):
+        start = timer()
+        for _ in range(number):
+            func()
+        elapsed = (timer() - start) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, seconds):
+    print(f"{name:<60} {seconds * 1000:10.3f}ms")
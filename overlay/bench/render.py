@@ -0,0 +1,87 @@
+"""UIThread frame render time with and without the text and glyph caches, on a 1080p surface with the channel,
+mute and progress bar widgets showing while paused."""
+
+import itertools
+import types
+
+import pygame
+
+from . import report, timeit
+from overlay.state import StateStore
+from overlay.threads.ui import UIThread
+
+
+SIZE = (1920, 1080)
+FRAMES = 2000
+
+
+class BenchApp:
+    FPS = 30
+
+    def __init__(self):
+        self.store = StateStore()
+        self.overscan = {"top": 0, "left": 0, "right": 0, "bottom": 0}
+
+    @property
+    def state(self):
+        return self.store.state
+
+    def subscribe_to_state_change(self, key, callback, queue=None):
+        self.store.subscribe_to_state_change(key, callback, queue)
+
+    def subscribe_to_notification(self, key, callback, queue=None):
+        self.store.subscribe_to_notification(key, callback, queue)
+
+    def send(self, data):
+        pass
+
+
+class UncachedUIThread(UIThread):
+    # lru_cache(maxsize=0) doesn't cache anything
+    TEXT_CACHE_SIZE = 0
+    GLYPH_CACHE_SIZE = 0
+
+
+def make_ui(caches=True):
+    ui_cls = UIThread if caches else UncachedUIThread
+    app = BenchApp()
+    app.store.reset(
+        {
+            "videos": [{"path": "video.mp4", "title": "A Video With A Fairly Long Title", "isRRated": True}],
+            "videosSeq": 0,
+            "currentlyPlaying": "video.mp4",
+            "muted": False,
+            "paused": True,
+            "position": 0,
+            "duration": 5400,
+        }
+    )
+    ui = ui_cls(app)
+    ui.display = types.SimpleNamespace(width=SIZE[0], height=SIZE[1])
+    ui.surface = pygame.Surface(SIZE, pygame.SRCALPHA)
+    ui.currently_playing_changed()
+    ui.muted_changed()
+    ui.show_progress_bar()
+    return ui
+
+
+def main():
+    for name, caches in (("caches", True), ("no caches", False)):
+        ui = make_ui(caches)
+        positions = itertools.count()
+
+        def full_frame():
+            ui.render(0, full=True)
+
+        def position_frame():
+            ui.app.store.apply_message({"position": next(positions) % 5400})
+            ui.render(0)
+
+        report(f"{name}: every widget redrawn", timeit(full_frame, number=FRAMES))
+        report(f"{name}: position changed (typical)", timeit(position_frame, number=FRAMES))
+        if caches:
+            print(f"  {', '.join(f'{key}={value}' for key, value in ui.text_cache_stats().items())}")
+
+
+if __name__ == "__main__":
+    main()
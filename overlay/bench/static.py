@@ -0,0 +1,37 @@
+"""Static background CPU time per frame, generating a screen of noise every frame (the original) vs writing a frame
+from a StaticNoiseBank. Headless: numpy only, writing into a plain array shaped like the RGB565 display buffer."""
+
+import time
+
+import numpy
+
+from . import report, timeit
+from overlay.threads.static import StaticNoiseBank
+
+
+SIZES = ((1920, 1080), (1280, 720))
+SCALES = (1, 2, 4)
+FRAMES = 300
+
+
+def main():
+    rng = numpy.random.default_rng()
+    for width, height in SIZES:
+        buffer = numpy.zeros((height, width), dtype=numpy.uint16)
+        max_value = numpy.iinfo(buffer.dtype).max
+
+        def generate_frame():
+            static = rng.integers(0, max_value, size=buffer.shape, dtype=buffer.dtype, endpoint=True)
+            numpy.copyto(buffer, static)
+
+        report(f"{width}x{height}: generated every frame", timeit(generate_frame, FRAMES, time.process_time))
+        for scale in SCALES:
+            build_time = timeit(lambda: StaticNoiseBank(buffer.shape, buffer.dtype, scale), timer=time.process_time)
+            bank = StaticNoiseBank(buffer.shape, buffer.dtype, scale)
+            frame_time = timeit(lambda: bank.write_frame(buffer), FRAMES, time.process_time)
+            report(f"{width}x{height}: noise bank, scale {scale}", frame_time)
+            report(f"{width}x{height}: noise bank, scale {scale} (building it, once)", build_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,13 @@
 from __future__ import annotations
 
-from collections import defaultdict
-import json
 import threading
 import time
 import traceback
 
 from dotenv import dotenv_values
-import websocket
 
+from .client import StateClient
+from .state import StateStore
 from .threads.static import StaticBackgroundThread
 from .threads.ui import UIThread
 
@@ -23,11 +22,10 @@ class OverlayApp:
     env: dict
 
     def __init__(self):
-        self.state = {}
+        self.store = StateStore()
         self.env = dotenv_values("/.env")
+        self.client = StateClient(self.store, self.env["PASSWORD_USER"])
         self.threads_started = False
-        self._state_subscribers = defaultdict(list)
-        self._notification_subscribers = defaultdict(list)
         self.overscan = {o: int(self.env.get(f"OVERSCAN_{o.upper()}", 0)) for o in ("top", "left", "right", "bottom")}
 
     @staticmethod
@@ -47,11 +45,18 @@ class OverlayApp:
         thread.daemon = True
         return thread
 
-    def subscribe_to_state_change(self, key, callback):
-        self._state_subscribers[key].append(callback)
+    @property
+    def state(self):
+        return self.store.state
 
-    def subscribe_to_notification(self, key, callback):
-        self._notification_subscribers[key].append(callback)
+    def subscribe_to_state_change(self, key, callback, queue=None):
+        self.store.subscribe_to_state_change(key, callback, queue)
+
+    def subscribe_to_notification(self, key, callback, queue=None):
+        self.store.subscribe_to_notification(key, callback, queue)
+
+    def send(self, data):
+        self.client.send(data)
 
     def run(self):
         thread_objs = []
@@ -69,40 +74,12 @@ class OverlayApp:
             print(f"Starting {thread_obj.name} thread")
             threads.append(self._create_daemon_thread(thread_obj))
 
+        # Now that we have some state, we can start the threads
+        def start_threads():
+            if not self.threads_started:
+                for thread in threads:
+                    thread.start()
+                self.threads_started = True
+
         # Subscribe to websocket
-        while True:
-            try:
-                ws = websocket.WebSocket()
-                ws.connect("ws://backend:8000/backend")
-
-                ws.send(self.env["PASSWORD_USER"])
-                if ws.recv() != "PASSWORD_ACCEPTED_USER":
-                    raise Exception("Invalid password")
-
-                # first message is always full state
-                self.state = data = json.loads(ws.recv())
-
-                # Now that we have some state, we can start the threads
-                if not self.threads_started:
-                    for thread in threads:
-                        thread.start()
-                    self.threads_started = True
-
-                while True:
-                    for key, value in data.items():
-                        if key == "notify":
-                            type = value.pop("type")
-                            for callback in self._notification_subscribers[type]:
-                                callback(value)
-
-                        else:
-                            self.state[key] = value
-                            for callback in self._state_subscribers[key]:
-                                callback()
-
-                    data = json.loads(ws.recv())
-
-            except Exception:
-                print("Websocket subscriber threw exception. Retrying")
-                traceback.print_exc()
-                time.sleep(0.1)
+        self.client.run(on_full_state=start_threads)
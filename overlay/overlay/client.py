@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+import traceback
+
+import websocket
+
+
+class StateClient:
+    """Keeps a StateStore in sync with the backend over its websocket, reconnecting with exponential backoff.
+
+    websocket-client is blocking, so run() takes over the calling thread. send() can be called from any thread."""
+
+    URL = "ws://backend:8000/backend"
+    RECONNECT_MIN_DELAY = 0.25
+    RECONNECT_MAX_DELAY = 30.0
+
+    def __init__(self, store, password):
+        self.store = store
+        self._password = password
+        self._ws = None
+        self._send_lock = threading.Lock()
+
+    def send(self, data):
+        with self._send_lock:
+            if self._ws is not None and self._ws.connected:
+                try:
+                    self._ws.send(json.dumps(data))
+                except Exception:
+                    print("Couldn't send message to websocket")
+                    traceback.print_exc()
+
+    def _connect(self):
+        ws = websocket.WebSocket()
+        ws.connect(self.URL)
+
+        ws.send(self._password)
+        if ws.recv() != "PASSWORD_ACCEPTED_USER":
+            raise Exception("Invalid password")
+
+        with self._send_lock:
+            self._ws = ws
+        return ws
+
+    def _disconnect(self):
+        with self._send_lock:
+            ws, self._ws = self._ws, None
+        if ws is not None:
+            ws.close()
+
+    def run(self, on_full_state=None):
+        """Receive messages forever. on_full_state is called after the full state arrives on each connect, but
+        before it's passed to subscribers."""
+        delay = self.RECONNECT_MIN_DELAY
+
+        while True:
+            try:
+                ws = self._connect()
+
+                # first message is always full state
+                data = json.loads(ws.recv())
+                self.store.reset(data)
+                delay = self.RECONNECT_MIN_DELAY
+                if on_full_state is not None:
+                    on_full_state()
+
+                while True:
+                    if not self.store.apply_message(data):
+                        self.send({"videosResync": True})
+                    data = json.loads(ws.recv())
+
+            except Exception:
+                print(f"Websocket subscriber threw exception. Retrying in {delay:g}s")
+                traceback.print_exc()
+                self._disconnect()
+                time.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
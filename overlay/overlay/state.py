@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from functools import partial
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+
+class Channel(NamedTuple):
+    number: int
+    title: str
+    is_r_rated: bool
+
+
+class Snapshot(NamedTuple):
+    state: Mapping
+    channels: Mapping  # path -> Channel
+
+
+EMPTY_SNAPSHOT = Snapshot(MappingProxyType({}), MappingProxyType({}))
+
+
+class StateStore:
+    """Backend state as sent over the websocket, plus a channel index (path -> Channel) that's kept up to date as
+    catalog deltas come in, so lookups don't have to scan the videos list.
+
+    Each message is applied to copies and published as a new read-only Snapshot in a single assignment, so other
+    threads can read a consistent version without locking. Published values (ie the videos list) are never mutated.
+    Subscriber callbacks are called once the snapshot is published, either directly on the thread applying messages,
+    or put on the subscriber's queue to be run on its own thread."""
+
+    def __init__(self):
+        self.snapshot = EMPTY_SNAPSHOT
+        self._state_subscribers = defaultdict(list)
+        self._notification_subscribers = defaultdict(list)
+
+    @property
+    def state(self):
+        return self.snapshot.state
+
+    @property
+    def channels(self):
+        return self.snapshot.channels
+
+    def subscribe_to_state_change(self, key, callback, queue=None):
+        self._state_subscribers[key].append((callback, queue))
+
+    def subscribe_to_notification(self, key, callback, queue=None):
+        self._notification_subscribers[key].append((callback, queue))
+
+    @staticmethod
+    def _dispatch(subscribers, *args):
+        for callback, queue in subscribers:
+            if queue is None:
+                callback(*args)
+            else:
+                queue.put(partial(callback, *args))
+
+    def reset(self, state=None):
+        """Replace everything without calling subscribers, ie with the full state sent on connect."""
+        state = dict(state or {})
+        channels = self._index_channels(state["videos"], {}) if "videos" in state else {}
+        self.snapshot = Snapshot(MappingProxyType(state), MappingProxyType(channels))
+
+    def apply_message(self, data):
+        """Apply a message from the backend and call subscribers. Returns False if a catalog delta was missed and a
+        resync is needed."""
+        state, channels = dict(self.snapshot.state), self.snapshot.channels
+        in_sync, events = True, []
+        for key, value in data.items():
+            if key == "notify":
+                type = value.pop("type")
+                events.append((self._notification_subscribers[type], value))
+
+            elif key == "videosDelta":
+                channels = dict(channels)
+                if self._apply_videos_delta(state, channels, value):
+                    events.append((self._state_subscribers["videos"],))
+                else:
+                    in_sync = False
+
+            else:
+                state[key] = value
+                if key == "videos":
+                    channels = self._index_channels(value, {})
+                events.append((self._state_subscribers[key],))
+
+        self.snapshot = Snapshot(MappingProxyType(state), MappingProxyType(channels))
+        for subscribers, *args in events:
+            self._dispatch(subscribers, *args)
+        return in_sync
+
+    @staticmethod
+    def _index_channels(videos, channels, start=0):
+        for number, video in enumerate(videos[start:], start + 1):
+            channels[video["path"]] = Channel(number, video["title"], video["isRRated"])
+        return channels
+
+    def _apply_videos_delta(self, state, channels, delta):
+        """Apply a catalog delta to state["videos"] and channels (both copies, not yet published). Returns False if
+        a delta was missed and a resync is needed."""
+        seq = state.get("videosSeq", 0)
+        if delta["seq"] <= seq:
+            return True  # Stale delta, already included in a snapshot
+        elif delta["seq"] != seq + 1:
+            print(f"Missed catalog delta (have #{seq}, got #{delta['seq']}). Requesting resync.")
+            return False
+
+        videos = state["videos"]
+
+        # Changed videos only come with the fields that changed, so merge those into the videos we have
+        updated = list(delta["updated"])
+        for fields in delta["changed"]:
+            channel = channels.get(fields["path"])
+            updated.append({**(videos[channel.number - 1] if channel else {}), **fields})
+
+        if not delta["removed"] and all(
+            (channel := channels.get(video["path"])) and channel.number == video["index"] + 1 for video in updated
+        ):
+            # Nothing moved (ie metadata was probed), so only the changed videos need re-indexing
+            videos = list(videos)
+            for video in updated:
+                video = dict(video)
+                index = video.pop("index")
+                videos[index] = video
+                channels[video["path"]] = Channel(index + 1, video["title"], video["isRRated"])
+        else:
+            # Videos before the first one removed, moved or inserted keep their channel numbers
+            affected = set(delta["removed"]).union(video["path"] for video in updated)
+            first = min(
+                [channels[path].number - 1 for path in affected if path in channels]
+                + [video["index"] for video in updated],
+                default=len(videos),
+            )
+            videos = videos[:first] + [video for video in videos[first:] if video["path"] not in affected]
+            for video in sorted(updated, key=lambda video: video["index"]):
+                video = dict(video)
+                videos.insert(video.pop("index"), video)
+            for path in delta["removed"]:
+                channels.pop(path, None)
+            self._index_channels(videos, channels, first)
+
+        state["videos"] = videos
+        state["videosSeq"] = delta["seq"]
+        return True
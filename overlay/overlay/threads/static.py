@@ -12,6 +12,40 @@ if TYPE_CHECKING:
     from ..app import OverlayApp
 
 
+class StaticNoiseBank:
+    """Noise generated once up front, so a frame of static costs one pass over the display buffer instead of a whole
+    screen's worth of random numbers. Each frame is a view into the bank at a random offset, XORed with a random
+    value on its way into the buffer."""
+
+    DEFAULT_EXTRA_ROWS = 256  # Rows of noise beyond one frame, so there's plenty of offsets to choose from
+
+    def __init__(self, shape, dtype, scale=1, extra_rows=DEFAULT_EXTRA_ROWS):
+        self.scale = scale
+        self.height = shape[0] // scale
+        self.row_size = shape[1] // scale * scale
+        self._rng = numpy.random.default_rng()
+        self._max_value = numpy.iinfo(dtype).max
+        self._frame_size = self.height * self.row_size
+        self._max_offset = extra_rows * self.row_size
+
+        # Stored already upscaled horizontally, so writing a frame only has to repeat whole (contiguous) rows
+        noise = self._rng.integers(
+            0, self._max_value, size=(self.height + extra_rows) * (self.row_size // scale), dtype=dtype, endpoint=True
+        )
+        self._bank = numpy.repeat(noise, scale) if scale > 1 else noise
+
+    def write_frame(self, buffer):
+        # Offsets are a multiple of scale, so upscaled pixels don't straddle rows
+        offset = self._rng.integers(0, self._max_offset // self.scale, endpoint=True) * self.scale
+        frame = self._bank[offset : offset + self._frame_size].reshape(self.height, 1, self.row_size)
+        mask = buffer.dtype.type(self._rng.integers(0, self._max_value, endpoint=True))
+
+        # Each row of noise is broadcast over scale rows of the buffer. When the screen doesn't divide evenly, the
+        # few leftover rows and columns stay black.
+        out = buffer[: self.height * self.scale, : self.row_size].reshape(self.height, self.scale, self.row_size)
+        numpy.bitwise_xor(frame, mask, out=out)
+
+
 class StaticBackgroundThread:
     name = "static"
 
@@ -19,8 +53,9 @@ class StaticBackgroundThread:
         self._app = app
         self._show_static_queue = queue.Queue()
         self._display = DispmanX(pixel_format="RGB565", buffer_type="numpy", layer=-1)
-        self._max_buffer_value = numpy.iinfo(self._display.buffer.dtype).max
-        self._rng = numpy.random.default_rng()
+        self._noise = None
+        self._noise_scale = max(int(app.env.get("STATIC_SCALE") or 1), 1)
+        self._noise_extra_rows = int(app.env.get("STATIC_BANK_ROWS") or StaticNoiseBank.DEFAULT_EXTRA_ROWS)
 
         app.subscribe_to_state_change("currentlyPlaying", self.currently_playing_changed)
 
@@ -30,15 +65,15 @@ class StaticBackgroundThread:
 
     def _show_static_until_message(self):
         clock = pygame.time.Clock()
-        shape, dtype = self._display.buffer.shape, self._display.buffer.dtype
-
         while self._show_static_queue.empty():
-            static = self._rng.integers(0, self._max_buffer_value, size=shape, dtype=dtype, endpoint=True)
-            numpy.copyto(self._display.buffer, static)
+            self._noise.write_frame(self._display.buffer)
             self._display.update()
             clock.tick(self._app.FPS)
 
     def run(self):
+        # Built before static is first shown, rather than while it's competing with the player starting up
+        buffer = self._display.buffer
+        self._noise = StaticNoiseBank(buffer.shape, buffer.dtype, self._noise_scale, self._noise_extra_rows)
         show_static = True
 
         while True:
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
+import queue
 from typing import TYPE_CHECKING
 
 from dispmanx import DispmanX
@@ -30,18 +32,69 @@ def format_duration(seconds: int, force_hour: bool = False):
     return f"{s}{(seconds % 3600) // 60:02d}:{seconds % 60:02d}"
 
 
+class Widget:
+    """A piece of the UI drawn in retained mode. It's only redrawn when its key (everything it's drawn from, or None
+    when hidden) changes, and then only the area it covered before and after is redrawn."""
+
+    def __init__(self, get_key, draw):
+        self.get_key = get_key  # (tick, state) -> (key, tick when the key may next change by itself or None)
+        self.draw = draw  # key -> list of (surface to blit or color to fill, rect)
+        self.key = None
+        self.ops = []
+        self.rect = None  # Bounding rect of ops
+
+    def update(self, tick, state, force=False):
+        """Returns the deadline from get_key, and the rects that need redrawing (empty if nothing changed)."""
+        key, deadline = self.get_key(tick, state)
+        if key == self.key and not force:
+            return deadline, []
+
+        dirty = [self.rect] if self.rect is not None else []
+        self.key = key
+        self.ops = [] if key is None else self.draw(key)
+        self.rect = self.ops[0][1].unionall([rect for _, rect in self.ops[1:]]) if self.ops else None
+        if self.rect is not None:
+            dirty.append(self.rect)
+        return deadline, dirty
+
+    def replay(self, surface):
+        for source, rect in self.ops:
+            if isinstance(source, pygame.Surface):
+                surface.blit(source, rect)
+            else:
+                pygame.draw.rect(surface, source, rect)
+
+
 class UIThread:
     name = "ui"
+    TEXT_CACHE_SIZE = 256
+    GLYPH_CACHE_SIZE = 128
+    LOG_STATS_INTERVAL = 300000  # ms
 
     def __init__(self, app: OverlayApp):
         self.app = app
+        self._callbacks = queue.Queue()  # Subscriber callbacks, run on this thread before rendering
+        # Rendered surfaces are shared between callers, so they must never be drawn on
+        self._render_text_cached = lru_cache(maxsize=self.TEXT_CACHE_SIZE)(self._render_text)
+        self._render_glyph_cached = lru_cache(maxsize=self.GLYPH_CACHE_SIZE)(self._render_glyph)
         self.clear_all()
-        app.subscribe_to_state_change("currentlyPlaying", self.currently_playing_changed)
-        app.subscribe_to_state_change("muted", self.muted_changed)
-        app.subscribe_to_notification("seek", lambda _: self.show_progress_bar())
-        app.subscribe_to_notification("keyPress", self.key_press)
-        app.subscribe_to_notification("playPause", lambda _: self.currently_playing_changed())
-        app.subscribe_to_notification("playPause", lambda _: self.show_progress_bar())
+        self.widgets = [
+            Widget(self.channel_key, self.draw_channel),
+            Widget(self.muted_key, self.draw_muted),
+            Widget(self.progress_bar_key, self.draw_progress_bar),
+            Widget(self.power_button_info_key, self.draw_power_button_info),
+            Widget(self.paused_key, self.draw_paused),
+        ]
+        callbacks = self._callbacks
+        app.subscribe_to_state_change("currentlyPlaying", self.currently_playing_changed, callbacks)
+        app.subscribe_to_state_change("muted", self.muted_changed, callbacks)
+        app.subscribe_to_state_change("videos", self.videos_changed, callbacks)
+        for key in ("paused", "position", "duration"):
+            app.subscribe_to_state_change(key, lambda: None, callbacks)  # Only needs to wake up and render
+        app.subscribe_to_notification("seek", lambda _: self.show_progress_bar(), callbacks)
+        app.subscribe_to_notification("keyPress", self.key_press, callbacks)
+        app.subscribe_to_notification("playPause", lambda _: self.currently_playing_changed(), callbacks)
+        app.subscribe_to_notification("playPause", lambda _: self.show_progress_bar(), callbacks)
 
         fonts_dir = Path(__file__).parent.parent.parent / "fonts"
         self.fonts = {
@@ -77,7 +130,7 @@ class UIThread:
         button = data["button"]
         tick = pygame.time.get_ticks()
         if button in "KEY_MENUBACK":
-            expires, _, _ = self._display_channel
+            expires = self._display_channel[0]
             if expires < tick:
                 menuback_timeout = 10000
                 self.currently_playing_changed(timeout=menuback_timeout)
@@ -91,29 +144,83 @@ class UIThread:
             self._power_button_info = tick + 4000
 
     def currently_playing_changed(self, timeout=4500):
-        currently_playing = self.app.state["currentlyPlaying"]
+        snapshot = self.app.store.snapshot
+        currently_playing = snapshot.state["currentlyPlaying"]
 
         if currently_playing is None:
             self._display_channel = (-1, None, None, False)
         else:
-            channel, title, is_r_rated = "0", currently_playing, False
-            for channel, video in enumerate(self.app.state["videos"], 1):
-                if video["path"] == currently_playing:
-                    title = video["title"]
-                    is_r_rated = video["isRRated"]
-                    break
+            channel = snapshot.channels.get(currently_playing)
+            if channel is None:
+                channel, title, is_r_rated = "0", currently_playing, False
+            else:
+                channel, title, is_r_rated = channel
             self._display_channel = (pygame.time.get_ticks() + timeout, str(channel), title, is_r_rated)
 
+    def videos_changed(self):
+        # Catalog changes can renumber or rename what's playing, which is updated without showing it again
+        expires, *displayed = self._display_channel
+        snapshot = self.app.store.snapshot
+        channel = snapshot.channels.get(snapshot.state["currentlyPlaying"])
+        if displayed[0] is not None and channel is not None:
+            self._display_channel = (expires, str(channel.number), channel.title, channel.is_r_rated)
+
     def muted_changed(self, timeout=4500):
         muted = self.app.state["muted"]
         self._display_muted = (pygame.time.get_ticks() + timeout, muted)
 
     def show_progress_bar(self, timeout=4500):
         self._display_progress_bar = pygame.time.get_ticks() + timeout
+        # Backend only pushes progress frequently while someone is looking at it
+        self.app.send({"watchProgress": timeout / 1000})
 
     def render_font(self, text, fgcolor=WHITE, bgcolor=BLACK_ALPHA, size=24, font="regular", padding=15):
-        font = self.fonts.get(font)
-        text_surf, text_rect = font.render(text, fgcolor, size=size)
+        if isinstance(padding, list):
+            padding = tuple(padding)
+        surf, rect = self._render_text_cached(text, fgcolor, bgcolor, size, font, padding)
+        return surf, rect.copy()  # Callers move the rect
+
+    def render_digits(self, text, fgcolor=WHITE, bgcolor=BLACK_ALPHA, size=24, font="regular", padding=15):
+        """Same as render_font, but composes the text from cached glyphs. For text that changes often, made of a few
+        distinct characters (ie positions), so it doesn't need FreeType or the text cache."""
+        glyphs, pen_x = [], 0
+        for char in text:
+            glyph_surf, glyph_rect, advance = self._render_glyph_cached(char, fgcolor, size, font)
+            # Rects from FreeType are relative to the pen position: x is the left bearing, y the height above baseline
+            glyphs.append((glyph_surf, glyph_rect.move(round(pen_x), 0)))
+            pen_x += advance
+
+        left, right = min(rect.x for _, rect in glyphs), max(rect.right for _, rect in glyphs)
+        ascent, descent = max(rect.y for _, rect in glyphs), max(rect.height - rect.y for _, rect in glyphs)
+        text_surf = pygame.Surface((right - left, ascent + descent), pygame.SRCALPHA)
+        for glyph_surf, rect in glyphs:
+            text_surf.blit(glyph_surf, (rect.x - left, ascent - rect.y))
+        return self._add_box(text_surf, pygame.Rect(left, ascent, right - left, ascent + descent), bgcolor, padding)
+
+    def text_cache_stats(self):
+        text, glyph = self._render_text_cached.cache_info(), self._render_glyph_cached.cache_info()
+        return {
+            "text_hits": text.hits,
+            "text_misses": text.misses,
+            "text_size": text.currsize,
+            "glyph_hits": glyph.hits,
+            "glyph_misses": glyph.misses,
+        }
+
+    def log_text_cache_stats(self):
+        print(f"Text cache stats -- {', '.join(f'{key}={value}' for key, value in self.text_cache_stats().items())}")
+
+    def _render_glyph(self, char, fgcolor, size, font):
+        font = self.fonts[font]
+        surf, rect = font.render(char, fgcolor, size=size)
+        return surf, rect, font.get_metrics(char, size=size)[0][4]
+
+    def _render_text(self, text, fgcolor, bgcolor, size, font, padding):
+        text_surf, text_rect = self.fonts[font].render(text, fgcolor, size=size)
+        return self._add_box(text_surf, text_rect, bgcolor, padding)
+
+    @staticmethod
+    def _add_box(text_surf, text_rect, bgcolor, padding):
         if bgcolor is None:
             return text_surf, text_rect
         else:
@@ -130,95 +237,144 @@ class UIThread:
             box_surf.blit(text_surf, text_surf.get_rect(center=box_rect.center))
             return box_surf, box_rect
 
-    def render_channel(self, tick):
+    # Each widget has a *_key method, returning what it should show at a tick (None if hidden) and when that could
+    # next change without a callback, and a draw_* method to lay out a key as a list of blits and fills.
+
+    def channel_key(self, tick, state):
         expires, channel, title, is_r_rated = self._display_channel
-        if expires < tick and not self.app.state["paused"]:
-            return
+        if channel is None or (expires < tick and not state["paused"]):
+            return None, None
+        return (channel, title, is_r_rated), None if state["paused"] else expires + 1
 
+    def draw_channel(self, key):
+        channel, title, is_r_rated = key
         left, top = self.get_dimension("left"), self.get_dimension("top")
         surf, rect = self.render_font(channel, size=60)
         rect.topleft = (left, top)
-        self.surface.blit(surf, rect)
+        ops = [(surf, rect)]
         top += rect.height
 
         surf, rect = self.render_font(title, YELLOW, size=24, font="italic")
         rect.topleft = (left, top)
-        self.surface.blit(surf, rect)
+        ops.append((surf, rect))
         if is_r_rated:
             surf, r_rect = self.render_font("R", RED, size=22)
             r_rect.topleft = (rect.right + 10, top)
-            self.surface.blit(surf, r_rect)
+            ops.append((surf, r_rect))
+        return ops
 
-    def render_muted(self, tick):
+    def muted_key(self, tick, _):
         expires, muted = self._display_muted
         if expires < tick:
-            return
+            return None, None
+        return muted, expires + 1
 
+    def draw_muted(self, muted):
         right, top = self.get_dimension("right"), self.get_dimension("top")
         color, text = (RED, "sound off") if muted else (GREEN, "sound on")
         surf, rect = self.render_font(text, color, size=32)
         rect.topright = (right, top)
-        self.surface.blit(surf, rect)
+        return [(surf, rect)]
 
-    def render_progress_bar(self, tick):
+    def progress_bar_key(self, tick, state):
         expires = self._display_progress_bar
-        paused = self.app.state["paused"]
-        if expires < tick and not paused:
-            return
-
-        position, duration = self.app.state["position"], self.app.state["duration"]
-        if position is None or duration is None:
-            return
-
+        paused = state["paused"]
+        position, duration = state["position"], state["duration"]
+        if (expires < tick and not paused) or position is None or duration is None:
+            return None, None
+        return (position, duration), None if paused else expires + 1
+
+    def draw_progress_bar(self, key):
+        position, duration = key
         left, right, bottom = self.get_dimension("left"), self.get_dimension("right"), self.get_dimension("bottom")
-        surf, pos_rect = self.render_font(format_duration(position, duration >= 3600), size=20)
+        pos_surf, pos_rect = self.render_digits(format_duration(position, duration >= 3600), size=20)
         pos_rect.bottomleft = (left, bottom)
-        self.surface.blit(surf, pos_rect)
 
-        surf, dur_rect = self.render_font(format_duration(duration), size=22)
+        dur_surf, dur_rect = self.render_font(format_duration(duration), size=22)
         dur_rect.bottomright = (right, bottom)
-        self.surface.blit(surf, dur_rect)
 
         bar_rect = pygame.Rect((0, 0, dur_rect.left - pos_rect.right - 20 - 1, dur_rect.height - 14))
         bar_rect.center = ((dur_rect.left + pos_rect.right) // 2, dur_rect.centery)
-        pygame.draw.rect(self.surface, WHITE, bar_rect)
-
-        bar_rect.width = round(bar_rect.width * position / duration)
-        pygame.draw.rect(self.surface, BLUE, bar_rect)
-
-    def render_paused(self, tick):
-        if tick % 1500 < 1000:
-            centerx = self.get_dimension("centerx")
-            top = self.get_dimension("top", margin=15)
-
-            surf, rect = self.render_font("Paused", bgcolor=RED, size=30, font="italic", padding=20)
-            rect.midtop = (centerx, top)
-            self.surface.blit(surf, rect)
-
-    def render_power_button_info(self, tick):
+        progress_rect = bar_rect.copy()
+        progress_rect.width = round(bar_rect.width * position / duration)
+        return [(pos_surf, pos_rect), (dur_surf, dur_rect), (WHITE, bar_rect), (BLUE, progress_rect)]
+
+    def paused_key(self, tick, state):
+        if not state["paused"]:
+            return None, None
+        # Blinks: shown for 1000ms out of every 1500ms
+        phase = tick % 1500
+        return (True if phase < 1000 else None), tick - phase + (1000 if phase < 1000 else 1500)
+
+    def draw_paused(self, _):
+        centerx = self.get_dimension("centerx")
+        top = self.get_dimension("top", margin=15)
+        surf, rect = self.render_font("Paused", bgcolor=RED, size=30, font="italic", padding=20)
+        rect.midtop = (centerx, top)
+        return [(surf, rect)]
+
+    def power_button_info_key(self, tick, _):
         expires = self._power_button_info
         if expires < tick:
-            return
+            return None, None
+        # Colors flip every 500ms
+        return tick % 1000 >= 500, min(expires + 1, tick - tick % 500 + 500)
 
-        fgcolor, bgcolor = (WHITE, BLACK) if tick % 1000 < 500 else (BLACK, WHITE)
+    def draw_power_button_info(self, inverted):
+        fgcolor, bgcolor = (BLACK, WHITE) if inverted else (WHITE, BLACK)
         surf, rect = self.render_font("Turn Off TV Manually", fgcolor, bgcolor, size=32, padding=22)
         rect.center = (self.get_dimension("centerx"), self.get_dimension("centery"))
-        self.surface.blit(surf, rect)
+        return [(surf, rect)]
+
+    def render(self, tick, full=False):
+        """Redraw the regions of widgets that changed (or everything if full). Returns whether anything was redrawn,
+        and the earliest tick a widget could change by itself, or None if they're all waiting on callbacks."""
+        deadline, dirty = None, []
+        state = self.app.state  # One snapshot for the whole frame
+        for widget in self.widgets:
+            widget_deadline, widget_dirty = widget.update(tick, state, force=full)
+            dirty.extend(widget_dirty)
+            if widget_deadline is not None and (deadline is None or widget_deadline < deadline):
+                deadline = widget_deadline
+        if full:
+            dirty = [self.surface.get_rect()]
+
+        for rect in dirty:
+            # Same result as clearing and redrawing everything, restricted to rect
+            self.surface.set_clip(rect)
+            self.surface.fill(ALPHA)
+            for widget in self.widgets:
+                if widget.rect is not None and widget.rect.colliderect(rect):
+                    widget.replay(self.surface)
+        self.surface.set_clip(None)
+        return bool(dirty), deadline
 
     def run(self):
         self.display = display = DispmanX(pixel_format="RGBA", layer=1)
         self.surface = pygame.image.frombuffer(display.buffer, display.size, display.pixel_format)
         clock = pygame.time.Clock()
+        full = True  # Whatever was in the buffer before gets cleared
+        log_stats_tick = pygame.time.get_ticks() + self.LOG_STATS_INTERVAL
 
         while True:
-            self.surface.fill(ALPHA)
+            changed, deadline = self.render(pygame.time.get_ticks(), full=full)
+            full = False
+            if changed:
+                self.display.update()
+                clock.tick(self.app.FPS)  # Caps the frame rate when changes come in quickly
+
             tick = pygame.time.get_ticks()
-            self.render_channel(tick)
-            self.render_muted(tick)
-            self.render_progress_bar(tick)
-            self.render_power_button_info(tick)
-            if self.app.state["paused"]:
-                self.render_paused(tick)
-
-            self.display.update()
-            clock.tick(self.app.FPS)
+            if tick >= log_stats_tick:
+                self.log_text_cache_stats()
+                log_stats_tick = tick + self.LOG_STATS_INTERVAL
+
+            # Sleep until there's a callback to run, a widget is due to change (expire or blink) or stats are due
+            deadline = log_stats_tick if deadline is None else min(deadline, log_stats_tick)
+            timeout = max(deadline - tick, 0) / 1000
+            try:
+                callback = self._callbacks.get(timeout=timeout)
+                while True:
+                    callback()
+                    callback = self._callbacks.get_nowait()
+            except queue.Empty:
+                pass
@@ -0,0 +1,9 @@
+import sys
+import types
+
+
+try:
+    import dispmanx  # noqa: F401
+except (ImportError, SystemExit):
+    # Only loads on a Pi (exits without libbcm_host). Tests draw on plain pygame surfaces and never open a display.
+    sys.modules["dispmanx"] = types.SimpleNamespace(DispmanX=None)
@@ -0,0 +1,219 @@
+import random
+import types
+
+import pygame
+import pytest
+
+from overlay.state import StateStore
+from overlay.threads import ui
+from overlay.threads.ui import ALPHA, BLACK, BLACK_ALPHA, BLUE, format_duration, GREEN, RED, WHITE, YELLOW
+
+
+SIZE = (960, 540)
+FRAMES = 1500
+
+
+class FakeApp:
+    FPS = 30
+
+    def __init__(self, store):
+        self.store = store
+        self.overscan = {"top": 10, "left": 20, "right": 15, "bottom": 5}
+
+    @property
+    def state(self):
+        return self.store.state
+
+    def subscribe_to_state_change(self, key, callback, queue=None):
+        self.store.subscribe_to_state_change(key, callback, queue)
+
+    def subscribe_to_notification(self, key, callback, queue=None):
+        self.store.subscribe_to_notification(key, callback, queue)
+
+    def send(self, data):
+        pass
+
+
+class FullRedrawRenderer:
+    """The overlay's original renderer, from before retained-mode widgets and text caching: clears the surface and
+    draws everything with FreeType on every frame. What to show is read from a UIThread's display state."""
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.app = thread.app
+        self.fonts = thread.fonts
+        self.get_dimension = thread.get_dimension
+        self.surface = pygame.Surface(SIZE, pygame.SRCALPHA)
+
+    def render(self, tick):
+        self.surface.fill(ALPHA)
+        self.render_channel(tick)
+        self.render_muted(tick)
+        self.render_progress_bar(tick)
+        self.render_power_button_info(tick)
+        if self.app.state["paused"]:
+            self.render_paused(tick)
+        return self.surface
+
+    def render_font(self, text, fgcolor=WHITE, bgcolor=BLACK_ALPHA, size=24, font="regular", padding=15):
+        font = self.fonts.get(font)
+        text_surf, text_rect = font.render(text, fgcolor, size=size)
+        if bgcolor is None:
+            return text_surf, text_rect
+        else:
+            if padding is not None:
+                if isinstance(padding, (list, tuple)):
+                    padding_x, padding_y = padding
+                else:
+                    padding_x = padding_y = padding
+                if padding_x > 0 or padding_y > 0:
+                    text_rect = text_rect.inflate(padding_x, padding_y)
+            box_surf = pygame.Surface(text_rect.size, pygame.SRCALPHA)
+            box_rect = box_surf.get_rect()
+            box_surf.fill(bgcolor)
+            box_surf.blit(text_surf, text_surf.get_rect(center=box_rect.center))
+            return box_surf, box_rect
+
+    def render_channel(self, tick):
+        expires, channel, title, is_r_rated = self.thread._display_channel
+        # Nothing playing while paused used to raise here (rendering None), which the widget fixed by hiding it
+        if channel is None or (expires < tick and not self.app.state["paused"]):
+            return
+
+        left, top = self.get_dimension("left"), self.get_dimension("top")
+        surf, rect = self.render_font(channel, size=60)
+        rect.topleft = (left, top)
+        self.surface.blit(surf, rect)
+        top += rect.height
+
+        surf, rect = self.render_font(title, YELLOW, size=24, font="italic")
+        rect.topleft = (left, top)
+        self.surface.blit(surf, rect)
+        if is_r_rated:
+            surf, r_rect = self.render_font("R", RED, size=22)
+            r_rect.topleft = (rect.right + 10, top)
+            self.surface.blit(surf, r_rect)
+
+    def render_muted(self, tick):
+        expires, muted = self.thread._display_muted
+        if expires < tick:
+            return
+
+        right, top = self.get_dimension("right"), self.get_dimension("top")
+        color, text = (RED, "sound off") if muted else (GREEN, "sound on")
+        surf, rect = self.render_font(text, color, size=32)
+        rect.topright = (right, top)
+        self.surface.blit(surf, rect)
+
+    def render_progress_bar(self, tick):
+        expires = self.thread._display_progress_bar
+        paused = self.app.state["paused"]
+        if expires < tick and not paused:
+            return
+
+        position, duration = self.app.state["position"], self.app.state["duration"]
+        if position is None or duration is None:
+            return
+
+        left, right, bottom = self.get_dimension("left"), self.get_dimension("right"), self.get_dimension("bottom")
+        surf, pos_rect = self.render_font(format_duration(position, duration >= 3600), size=20)
+        pos_rect.bottomleft = (left, bottom)
+        self.surface.blit(surf, pos_rect)
+
+        surf, dur_rect = self.render_font(format_duration(duration), size=22)
+        dur_rect.bottomright = (right, bottom)
+        self.surface.blit(surf, dur_rect)
+
+        bar_rect = pygame.Rect((0, 0, dur_rect.left - pos_rect.right - 20 - 1, dur_rect.height - 14))
+        bar_rect.center = ((dur_rect.left + pos_rect.right) // 2, dur_rect.centery)
+        pygame.draw.rect(self.surface, WHITE, bar_rect)
+
+        bar_rect.width = round(bar_rect.width * position / duration)
+        pygame.draw.rect(self.surface, BLUE, bar_rect)
+
+    def render_paused(self, tick):
+        if tick % 1500 < 1000:
+            centerx = self.get_dimension("centerx")
+            top = self.get_dimension("top", margin=15)
+
+            surf, rect = self.render_font("Paused", bgcolor=RED, size=30, font="italic", padding=20)
+            rect.midtop = (centerx, top)
+            self.surface.blit(surf, rect)
+
+    def render_power_button_info(self, tick):
+        expires = self.thread._power_button_info
+        if expires < tick:
+            return
+
+        fgcolor, bgcolor = (WHITE, BLACK) if tick % 1000 < 500 else (BLACK, WHITE)
+        surf, rect = self.render_font("Turn Off TV Manually", fgcolor, bgcolor, size=32, padding=22)
+        rect.center = (self.get_dimension("centerx"), self.get_dimension("centery"))
+        self.surface.blit(surf, rect)
+
+
+@pytest.fixture
+def ticks(monkeypatch):
+    ticks = [0]
+    monkeypatch.setattr(pygame.time, "get_ticks", lambda: ticks[0])
+    return ticks
+
+
+def make_ui(store):
+    thread = ui.UIThread(FakeApp(store))
+    thread.display = types.SimpleNamespace(width=SIZE[0], height=SIZE[1])
+    thread.surface = pygame.Surface(SIZE, pygame.SRCALPHA)
+    return thread
+
+
+def tobytes(surface):
+    return pygame.image.tobytes(surface, "RGBA")
+
+
+def run_callbacks(thread):
+    while not thread._callbacks.empty():
+        thread._callbacks.get_nowait()()
+
+
+def test_dirty_region_rendering_matches_original_full_redraw(ticks):
+    """Every frame drawn incrementally (only dirty regions, cached text) must be pixel-identical to the original
+    renderer clearing and redrawing everything."""
+    rng = random.Random(1)
+    videos = [{"path": f"v{i}.mp4", "title": f"Video number {i}", "isRRated": i % 3 == 0} for i in range(20)]
+    store = StateStore()
+    store.reset({"videos": videos, "videosSeq": 0, "currentlyPlaying": None, "muted": False, "paused": False})
+    store.apply_message({"position": None, "duration": None})
+    thread = make_ui(store)
+    reference = FullRedrawRenderer(thread)
+
+    redraws, deadline, previous = 0, None, None
+    for frame in range(FRAMES):
+        ticks[0] += rng.choice([1, 5, 16, 33, 33, 33, 100, 400])
+        state, r = store.state, rng.random()
+        if r < 0.02:
+            playing = rng.choice([None] + [video["path"] for video in videos])
+            store.apply_message({"currentlyPlaying": playing, **({"paused": False} if playing is None else {})})
+        elif r < 0.04:
+            store.apply_message({"muted": not state["muted"]})
+        elif r < 0.06 and state["currentlyPlaying"] is not None:
+            store.apply_message({"paused": not state["paused"]})
+        elif r < 0.16:
+            duration = rng.choice([None, 100, 4000.5])
+            store.apply_message({"duration": duration, "position": duration and rng.uniform(0, duration)})
+        elif r < 0.18:
+            store.apply_message({"notify": {"type": "seek"}})
+        elif r < 0.20:
+            button = rng.choice(["KEY_POWER", "KEY_VOLUMEUP", "KEY_MENUBACK"])
+            store.apply_message({"notify": {"type": "keyPress", "button": button}})
+
+        woken = not thread._callbacks.empty()
+        run_callbacks(thread)
+        changed, next_deadline = thread.render(ticks[0], full=frame == 0)
+        redraws += changed
+        expected = tobytes(reference.render(ticks[0]))
+        assert tobytes(thread.surface) == expected, frame
+        # The UI thread sleeps until a callback or the deadline, so nothing may change before then without one
+        if frame > 0 and not woken and (deadline is None or ticks[0] < deadline):
+            assert expected == previous, frame
+        deadline, previous = next_deadline, expected
+
+    assert 0 < redraws < FRAMES  # Sanity check that the scenario shows things, and idles sometimes